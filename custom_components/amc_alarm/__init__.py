@@ -1,15 +1,17 @@
 """AMC alarm integration."""
 import asyncio
 import logging
+import time
 from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_EMAIL, CONF_PASSWORD, SERVICE_RELOAD
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
 from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady, ConfigEntryError
 from homeassistant.helpers.update_coordinator import UpdateFailed
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers.service import async_register_admin_service
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers import issue_registry as ir
 from .coordinator import AmcDataUpdateCoordinator
 from .const import *
@@ -42,12 +44,27 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     entry.runtime_data = coordinator
     
-    # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-    await coordinator.async_config_entry_first_refresh()
+    start_time = time.monotonic()
+    try:
+        from_snapshot = await coordinator.async_load_snapshot()
+        if from_snapshot:
+            # entities created from the saved states (marked stale), the live states are requested in background
+            entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} live states {entry.entry_id}")
+        else:
+            # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
+            await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # the api is attached to the shared connection manager: a failed setup must not stay as owner of the connection
+        await coordinator.api.disconnect()
+        entry.runtime_data = None
+        raise
 
     # Set up all platforms for this device/entry.
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     #hass.config_entries.async_setup_platforms(entry, PLATFORMS)
+    coordinator.startup_stats["from_snapshot"] = from_snapshot
+    coordinator.startup_stats["entities_seconds"] = round(time.monotonic() - start_time, 3)
+    _LOGGER.info("Entities created in %.3f s (from snapshot: %s)", coordinator.startup_stats["entities_seconds"], from_snapshot)
 
     # Reload entry when its updated.
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
@@ -69,6 +86,11 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the saved states snapshot."""
+    await Store(hass, STORAGE_VERSION, STORAGE_KEY + entry.entry_id).async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     """Reload the config entry when it changed."""
@@ -91,6 +113,27 @@ async def add_services(hass: HomeAssistant):
         _handle_reload,
     )
 
+    async def _handle_get_metrics(call: ServiceCall) -> ServiceResponse:
+        """Metrics of the loaded entries, by entry title."""
+        metrics = {}
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            coordinator: AmcDataUpdateCoordinator = getattr(entry, "runtime_data", None)
+            if coordinator:
+                metrics[entry.title] = {
+                    **coordinator.api.metrics_stats(),
+                    "optimistic": coordinator.api.optimistic_stats(),
+                    "flush": coordinator.api.flush_stats(),
+                    "trace": coordinator.api.trace_report(),
+                }
+        return {"entries": metrics}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_METRICS,
+        _handle_get_metrics,
+        supports_response=SupportsResponse.ONLY,
+    )
+
 async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Gestisce la migrazione dei config entries quando VERSION cambia."""
     _LOGGER.warning("Migrating config entry from version %s", entry.version)
@@ -112,8 +155,10 @@ async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         new_data = {**entry.data}
         if CONF_USER_PIN in new_data:
             coordinator = AmcDataUpdateCoordinator(hass, entry=entry)            
-            await coordinator.async_config_entry_first_refresh()
-            await coordinator.api.disconnect()
+            try:
+                await coordinator.async_config_entry_first_refresh()
+            finally:
+                await coordinator.api.disconnect()
             pin = new_data.pop(CONF_USER_PIN)
             user = coordinator.data_parsed.user_by_pin(coordinator.api._central_id, pin)
             new_data[CONF_USER_INDEX] = user.index
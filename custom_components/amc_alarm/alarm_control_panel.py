@@ -6,14 +6,18 @@ from homeassistant.components.alarm_control_panel import (
 from homeassistant.components.alarm_control_panel import AlarmControlPanelEntityFeature, AlarmControlPanelState, CodeFormat
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from .coordinator import AmcDataUpdateCoordinator
 from .amc_alarm_api.amc_proto import CentralDataSections, AmcEntry, AmcAlarmState
-from .amc_alarm_api.api import AmcStatesParser
+from .amc_alarm_api.api import AmcStatesParser, states_key
 from .const import *
 from .entity import AmcBaseEntity
 from typing import List
+import logging
+
+_LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(
@@ -83,7 +87,8 @@ class AmcGeneralAlarm(AmcBaseEntity, AlarmControlPanelEntity):
             coordinator=coordinator,
             amc_entry_fn=lambda: amc_entry,
             name_prefix="",
-            id_prefix="alarm_general_"
+            id_prefix="alarm_general_",
+            context={states_key(CentralDataSections.GROUPS), states_key(CentralDataSections.AREAS)}
         )
 
         self._feature_data: dict[int, dict[str, Any]] = {}  # <-- feature -> dati multipli
@@ -147,19 +152,9 @@ class AmcGeneralAlarm(AmcBaseEntity, AlarmControlPanelEntity):
             feature_name = AlarmControlPanelEntityFeature(feature).name.replace("ARM_", "")
             raise KeyError(f"Arm {feature_name} not supported, no entities selected in wizard.")
         data = self._feature_data[feature]
-        entries = self._get_entries(data)
-        processed_ids = set()  # set esistente
-        for amc_entry in entries:
-            # skip if not disarmed
-            if amc_entry.arm_state != AmcAlarmState.Disarmed:
-                continue
-            #if selected an area included in a group, ignore it
-            if amc_entry.filters and any(f in processed_ids for f in amc_entry.filters):
-                continue
-            # mark this entry as processed
-            processed_ids.add(amc_entry.filter_id)
-            # send the command
-            await api.command_set_states(amc_entry.group, amc_entry.index, 1, code)
+        # skip if not disarmed
+        entries = [e for e in self._get_entries(data) if e.arm_state == AmcAlarmState.Disarmed]
+        await self._async_set_states_batch(entries, 1, code)
 
 
     async def async_alarm_disarm(self, code: str | None = None) -> None:
@@ -174,15 +169,21 @@ class AmcGeneralAlarm(AmcBaseEntity, AlarmControlPanelEntity):
             e for e in [*state.groups(api._central_id).list, *state.areas(api._central_id).list]
             if e.arm_state != AmcAlarmState.Disarmed
         ]
-        processed_ids = set()  # set esistente
-        for amc_entry in entries:
-            #if selected an area included in a group, ignore it
-            if amc_entry.filters and any(f in processed_ids for f in amc_entry.filters):
-                continue
-            # mark this entry as processed
-            processed_ids.add(amc_entry.filter_id)
-            # send the command
-            await api.command_set_states(amc_entry.group, amc_entry.index, 0, code)
+        await self._async_set_states_batch(entries, 0, code)
+
+    async def _async_set_states_batch(self, entries: List[AmcEntry], state: int, code: str | None) -> None:
+        if not entries:
+            return
+        results = await self.coordinator.api.command_set_states_batch(entries, state, code)
+        errors = {k: v for k, v in results.items() if v is not None}
+        for filter_id, error in errors.items():
+            _LOGGER.warning("Set state %s not confirmed for %s: %s", state, filter_id, error)
+        if errors:
+            # a partial failure too: some groups or areas are left in the previous state
+            raise HomeAssistantError(
+                f"Set state {state} not confirmed for {len(errors)} of {len(results)}: "
+                + ", ".join(f"{filter_id} ({error})" for filter_id, error in errors.items())
+            ) from next(iter(errors.values()))
 
     def _get_entries(self, data) -> List[AmcEntry]:
         api = self.coordinator.api
@@ -190,9 +191,19 @@ class AmcGeneralAlarm(AmcBaseEntity, AlarmControlPanelEntity):
         entries: List[AmcEntry] = [api.raw_entities[i] for i in ids if i in api.raw_entities]
         return entries
 
+    @property
+    def _amc_optimistic_state(self) -> int | None:
+        # pending if any group or area is, arming prevails
+        sections = {str(CentralDataSections.GROUPS), str(CentralDataSections.AREAS)}
+        pending = [s for filter_id, s in self.coordinator.api.optimistic_states().items() if filter_id.partition(".")[0] in sections]
+        return max(pending, default=None)
+
     @property
     def alarm_state(self) -> AlarmControlPanelState | None:
         api = self.coordinator.api
+        pending = self._amc_optimistic_state
+        if pending is not None:
+            return AlarmControlPanelState.ARMING if pending == 1 else AlarmControlPanelState.DISARMING
         if not api.armed_any:
             return AlarmControlPanelState.DISARMED
         
@@ -255,13 +266,19 @@ class AmcEntryAlarmEntity(AmcBaseEntity, AlarmControlPanelEntity):
 
     @property
     def alarm_state(self) -> AlarmControlPanelState | None:
+        pending = self._amc_optimistic_state
         
         if self._amc_entry.group == CentralDataSections.ZONES:
             #for zones, can't use a pending state, pending indicate that zone is enabled for next activation
             state = amc_alarm_state_to_ha_state(self._amc_entry.arm_state, AlarmControlPanelState.ARMED_AWAY, AlarmControlPanelState.ARMED_AWAY)
-            if state == AlarmControlPanelState.DISARMED and self._amc_entry.states.bit_on == 1:
+            bit_on = self._amc_entry.states.bit_on if pending is None else pending
+            if state == AlarmControlPanelState.DISARMED and bit_on == 1:
                 return AlarmControlPanelState.PENDING
             return state
+
+        if pending is not None:
+            #requested from HA, waiting the panel
+            return AlarmControlPanelState.ARMING if pending == 1 else AlarmControlPanelState.DISARMING
             
         state = amc_alarm_state_to_ha_state(self._amc_entry.arm_state, AlarmControlPanelState.ARMED_AWAY)
         return state
@@ -1,5 +1,5 @@
 """AMC Alarm websocket Client."""
 
-from .api import SimplifiedAmcApi
+from .api import AmcConnectionManager, SimplifiedAmcApi
 
-__all__ = ["SimplifiedAmcApi"]
+__all__ = ["AmcConnectionManager", "SimplifiedAmcApi"]
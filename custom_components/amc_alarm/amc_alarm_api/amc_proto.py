@@ -133,7 +133,7 @@ class AmcUser(BaseModel):
 class AmcPatch(BaseModel):
     op: str
     path: str
-    value: dict | str | int
+    value: dict | list | str | int | float | None = None # no value for remove
 
 class AmcLogin(BaseModel):
     email: str
@@ -2,13 +2,30 @@ import asyncio
 import logging
 import json 
 import time
+import types
+from collections import deque
 from enum import Enum
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Union, get_args, get_origin
 
 import aiohttp
 from aiohttp import WSMessage
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    # bundled with Home Assistant, faster than json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 from .amc_proto import *
+from .capture import FrameCapture
+from .metrics import AmcMetrics, percentiles
+from .trace import (
+    AmcTraceCollector, AmcTracer, TRACE_CALCULATED_STATES, TRACE_CALLBACK, TRACE_FLUSH, TRACE_JSON_PATCH,
+    TRACE_MESSAGE, TRACE_PARSE, TRACE_VALIDATE,
+)
 from .exceptions import * #AmcException, ConnectionFailed, AuthenticationFailed, AmcCentralNotFoundException, AmcCentralStatusErrorException
 
 _LOGGER = logging.getLogger(__name__)
@@ -33,7 +50,10 @@ class CommandState(Enum):
     KO = 3
 
 class CommandMessageInfo():
+    LAST_MESSAGE_DATA_MAX = 4096 # the big frames (getStates) are kept truncated, the states are in the typed models
+
     state: int = CommandState.NONE
+    id: int = None
     key : str = None 
     error: Exception = None
     result = None
@@ -42,17 +62,46 @@ class CommandMessageInfo():
     request_time = None
     response_time = None
 
+    def __init__(self):
+        # set when the command is completed (or waiters must check again the connection state)
+        self._done = asyncio.Event()
+
+    def set_started(self):
+        self.state = CommandState.STARTED
+        self.error = None
+        self._done.clear()
     def set_ok(self, res = None):
         self.result = res
         self.state = CommandState.OK
+        self._done.set()
     def set_ko(self, err : Exception | str = None):
         if isinstance(err, str):
             err = Exception(err)
         self.error = err if err else self.error
         self.state = CommandState.KO
+        self._done.set()
+    def wake(self):
+        self._done.set()
+
+    def set_last_message_data(self, data: str):
+        if data and len(data) > self.LAST_MESSAGE_DATA_MAX:
+            data = f"{data[:self.LAST_MESSAGE_DATA_MAX]}... ({len(data)} chars)"
+        self.last_message_data = data
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for set_ok/set_ko/wake, return False on timeout."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if self.state in (CommandState.NONE, CommandState.STARTED):
+            # only woken up, next wait must block again
+            self._done.clear()
+        return True
 
     def dict(self):
         return {
+            "id": self.id,
             "key": self.key,
             "state": getattr(self.state, "name", str(self.state)),  # se enum → name
             "request": self.msg,
@@ -63,8 +112,15 @@ class CommandMessageInfo():
         }
 
 class SimplifiedAmcApi:
+    WS_URL = "wss://service.amc-cloud.com/ws/client"
     MAX_RETRY_DELAY = 600  # 10 min
     DEVICE_OFFLINE_DELAY = 5 # set as offline only after 5 seconds, many time request to relogin
+    COMMAND_TIMEOUT = 30 # seconds waiting the response of a command
+    FLUSH_DELAY = 0.03 # seconds for coalesce the updates before calculate states and call the callback
+    RECEIVE_QUEUE_SIZE = 500 # received messages waiting to be processed, on overflow patches are replaced by a getStates
+    CENTRAL_OK_TIMEOUT = 5 # seconds waiting the central before send a command
+    NOTIFICATIONS_MAX = 50 # notifications kept, the lists patched by the cloud are trimmed too
+    OPTIMISTIC_TIMEOUT = 10 # seconds showing the state requested by a setStates, rolled back if not confirmed by the patches
 
     def __init__(
         self,
@@ -74,15 +130,19 @@ class SimplifiedAmcApi:
         central_username,
         central_password,
         async_state_updated_callback=None,
+        ws_url: str = None,
     ):
         self._messages: dict[str, CommandMessageInfo] = {}
+        # in-flight commands by key, in send order: responses are correlated to the oldest one
+        self._pending_messages: dict[str, deque[CommandMessageInfo]] = {}
+        self._messages_seq = 0
         self._raw_states: dict[str, AmcCentralResponse] = {}
         self._raw_states_central_valid : bool = False
         self._raw_states_centralstatus_valid : bool = False        
         self.raw_entities: dict[str, AmcEntry] = {}
         self._send_message_retrying : bool = False
 
-        self._ws_url = "wss://service.amc-cloud.com/ws/client"
+        self._ws_url = ws_url or self.WS_URL
         self._login_email = login_email
         self._password = password
         self._central_id = central_id
@@ -92,9 +152,13 @@ class SimplifiedAmcApi:
         self.amcProtoVer = None
 
         self._listen_task = None
-        self._checks_task = None
-        self._checks_paused_to_date = None
+        self._receive_task = None
+        self._receive_queue: asyncio.Queue | None = None
+        self._receive_queue_max_depth = 0
+        self._receive_queue_overflows = 0
         self._device_online_to_date = None
+        # timer of the end of the DEVICE_OFFLINE_DELAY grace period, no polling between the events
+        self._device_offline_handle: asyncio.TimerHandle | None = None
         self._device_available = False
         self._ws_state = ConnectionState.DISCONNECTED
         self._ws_state_detail = None
@@ -103,17 +167,57 @@ class SimplifiedAmcApi:
         self._sessionToken = None
         self._ws_state_disconnecting : bool = False
         self._ws_state_stop_exeception : Exception = None
+        # set and replaced at every state change, for wake up who is waiting a state
+        self._ws_state_event = asyncio.Event()
         
         self._callback = async_state_updated_callback
+        # connection shared among the centrals of the same account, see AmcConnectionManager
+        self._manager: AmcConnectionManager | None = None
+        self._owner: SimplifiedAmcApi | None = None
+        self._followers: dict[str, SimplifiedAmcApi] = {}
+        self._capture: FrameCapture | None = None
+        self.flush_delay = self.FLUSH_DELAY
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_notify_time = None
+        self._flush_latencies: deque[float] = deque(maxlen=1000)
+        self.metrics = AmcMetrics()
+        # hooks around the stages of the message handling, None (no overhead) if not tracing
+        self._tracer: AmcTracer | None = None
+        self._calc_pending = False
+        self._calc_keys: set[str] | None = set()
+        # states requested by setStates and not yet confirmed: filter_id -> (state, request time, deadline)
+        self._optimistic: dict[str, tuple[int, float, float]] = {}
+        self._optimistic_handle: asyncio.TimerHandle | None = None
+        self._optimistic_latencies: deque[float] = deque(maxlen=1000)
+        self._optimistic_rollbacks = 0
         self._callback_get_states_disabled : bool = False
         self._last_login_date = None
 
-        self.raw_states_json_model = None
+        # positions of the list items by their "index", for resolve the patch paths: id(list) -> (list, {index: position})
+        self._list_positions: dict[int, tuple[list, dict[int, int]]] = {}
+        self.notifications = AmcNotificationStore(self.NOTIFICATIONS_MAX)
+        self.state_table = AmcStateTable()
         self.armed_any = False
+        self._armed_ids: set[str] = set()
+        # arm hierarchy by filter_id, built from the filters of the entries
+        self._group_areas: dict[str, list[AmcEntry]] = {}
+        self._area_groups: dict[str, list[AmcEntry]] = {}
+        self._area_zones: dict[str, list[AmcEntry]] = {}
+        self._zone_areas: dict[str, list[AmcEntry]] = {}
+        #incremented each time the states are updated, used for cache the parser indexes
+        self.states_version = 0
+
+        #keys of the states changed, see states_key. None if all the states could be changed
+        self._changed_keys: set[str] | None = None
 
         self._msg_quee_login : bool = False
         self._msg_quee_get_states : bool = False
 
+        # loop times of the last getStates ok, patch applied and patch failed, for the adaptive polling
+        self.last_states_time = None
+        self.last_patch_time = None
+        self.last_patch_error_time = None
+
         self._failed_attempts = 0
         self._failed_attempts_last_msg = None
         self._retry_delay = 0
@@ -141,6 +245,8 @@ class SimplifiedAmcApi:
             await self.command_get_states_and_return()
 
     async def _login_if_required(self) -> CommandMessageInfo:
+        if self._owner:
+            return await self._owner._login_if_required()
         message = self._get_message_info(AmcCommands.LOGIN_USER)
         if self._ws_state != ConnectionState.STOPPED:
             #se sto nella pausa della connessione, devo aspettare
@@ -159,31 +265,37 @@ class SimplifiedAmcApi:
         return message
 
     async def ensure_logged(self):
+        if self._owner:
+            return await self._owner.ensure_logged()
         message = await self._login_if_required()
         await self._get_message_info_result(message)
 
-    async def _ensure_central_ok(self, timeout=5):
+    async def _ensure_central_ok(self, timeout=None):
         if (self._ws_state == ConnectionState.CENTRAL_OK):
             return
-        end_time = self._event_loop.time() + timeout
+        end_time = self._event_loop.time() + (timeout if timeout is not None else self.CENTRAL_OK_TIMEOUT)
         while True:
             if (self._ws_state == ConnectionState.CENTRAL_OK):
                 return
             if (self._ws_state == ConnectionState.STOPPED):
                 break
-            if self._event_loop.time() >= end_time:
+            remaining = end_time - self._event_loop.time()
+            if remaining <= 0:
                 break # timeout scaduto
-            await asyncio.sleep(0.1)
+            try:
+                await asyncio.wait_for(self._ws_state_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
         if self._ws_state_stop_exeception:
             raise self._ws_state_stop_exeception
             
         # Error in task listener
-        if self._listen_task.done():
+        if self._listen_task and self._listen_task.done():
             exc = self._listen_task.exception()
             if exc:
                 raise exc
 
-        raise asyncio.TimeoutError(f"Error waiting state {state}. Current state {self._ws_state} {self._ws_state_detail}")
+        raise asyncio.TimeoutError(f"Error waiting state {ConnectionState.CENTRAL_OK}. Current state {self._ws_state} {self._ws_state_detail}")
             
 
     async def command_get_states_and_return(self) -> dict[str, AmcCentralResponse]:
@@ -197,10 +309,29 @@ class SimplifiedAmcApi:
             await asyncio.sleep(0.2) # wait for execute _callback_get_states_disabled
             self._callback_get_states_disabled = False
 
+    async def load_states_snapshot(self, json_model: dict, pin_required: bool | None = None) -> bool:
+        """Load the states saved from a previous getStates response.
+        The states are not marked as valid: the live getStates is still requested on connect.
+        pin_required: saved with the states when their users are not (None: from the states)."""
+        data = AmcCommandResponse.model_validate(json_model, strict=False)
+        if not data.centrals or self._central_id not in data.centrals:
+            return False
+        states = AmcStatesParser(data.centrals)
+        self.amcProtoVer = data.centrals[self._central_id].amcProtoVer or 1
+        if pin_required or states.users(self._central_id) or self.amcProtoVer >= 2:
+            self.pin_required = True
+        self._set_raw_states(data.centrals)
+        self._sync_notifications()
+        self._mark_changed(None)
+        await self._set_calculated_states()
+        return True
 
     async def disconnect(self):
         _LOGGER.debug("Disconnecting")
+        if self._manager:
+            await self._manager.detach(self)
         await self._change_state(ConnectionState.STOPPED)
+        await self._flush()
         if self._listen_task and not self._listen_task.done():
             self._listen_task.cancel()
             try:
@@ -208,22 +339,21 @@ class SimplifiedAmcApi:
             except asyncio.CancelledError:
                 pass
             self._listen_task = None
-        if self._checks_task and not self._checks_task.done():
-            self._checks_task.cancel()
-            try:
-                await self._checks_task
-            except asyncio.CancelledError:
-                pass
-            self._checks_task = None
+        self._schedule_device_offline(None)
+        self._clear_optimistic()
         if self._websocket:
             await self._websocket.close()
             self._websocket = None
         if self._aiohttp_session:
             await self._aiohttp_session.close()
             self._aiohttp_session = None
+        self.stop_capture()
+        self.stop_trace()
         #await self._change_state(ConnectionState.DISCONNECTED)
 
     async def _listen_start(self) -> None:
+        if self._owner:
+            return await self._owner._listen_start()
         if self._ws_state != ConnectionState.STOPPED:
             #se sto nella pausa della connessione, devo aspettare
             #if self._ws_state_disconnecting and self._ws_state != ConnectionState.STOPPED and self._listen_task and not self._listen_task.done():
@@ -234,9 +364,6 @@ class SimplifiedAmcApi:
             if not self._listen_task or self._listen_task.done():
                 await self._change_state(ConnectionState.STARTING)
                 self._listen_task = self._create_task(self._listen())
-                
-            if not self._checks_task or self._checks_task.done():
-                self._checks_task = self._create_task(self._checks())
 
 
     async def _listen(self) -> None:
@@ -257,8 +384,8 @@ class SimplifiedAmcApi:
                 self._ws_url, heartbeat=30, autoping=True
             ) as ws_client:
                 self._websocket = ws_client
+                self.metrics.connects += 1
                 _LOGGER.debug("Connected to websocket %s" % self._ws_url)
-                self._checks_pause()
                 await self._change_state(ConnectionState.CONNECTED)
 
                 self._sessionToken = None  #can't reuse the last login, need to relogin after disconnection
@@ -266,13 +393,16 @@ class SimplifiedAmcApi:
                 self._msg_quee_get_states = True
                 await self._send_msg_quee()
 
+                # messages are processed by another task, a slow processing doesn't block the websocket.
+                # Bounded by _receive_enqueue: only the patches are discarded, the command replies are always kept
+                self._receive_queue = asyncio.Queue()
+                self._receive_task = self._create_task(self._receive_consumer(ws_client, self._receive_queue))
+
                 message: WSMessage
                 async for message in ws_client:
                     if self._ws_state == ConnectionState.STOPPED:
                         break
 
-                    self._checks_pause()
-
                     if message.type == aiohttp.WSMsgType.ERROR:
                         #self._sessionToken = None
                         await self._manage_running_error("Error received from WS server", Exception(f"WSMessageError: {message}"))
@@ -284,15 +414,12 @@ class SimplifiedAmcApi:
 
                     if message.type == aiohttp.WSMsgType.TEXT:
                         _LOGGER.debug("Websocket received data: %s", message.data)
-                        try:
-                            await self._process_message(message)
-                        except Exception as error:
-                            _LOGGER.exception("Error processing message data: %s, data=%s" % (error, message.data))
+                        if self._capture:
+                            self._capture.write("in", message.data)
+                        self._receive_enqueue(self._receive_queue, message)
 
                     if self._ws_state == ConnectionState.STOPPED or self._ws_state == ConnectionState.DISCONNECTED:
                         break
-                    
-                    await self._send_msg_quee()
                         
         except asyncio.CancelledError:
             pass
@@ -303,6 +430,14 @@ class SimplifiedAmcApi:
         except Exception as error:
             await self._manage_running_error("Unexpected exception occurred", error)
         finally:
+            if self._receive_task and not self._receive_task.done():
+                self._receive_task.cancel()
+                try:
+                    await self._receive_task
+                except asyncio.CancelledError:
+                    pass
+            self._receive_task = None
+            self._receive_queue = None
             if self._websocket:
                 await self._websocket.close()
                 self._websocket = None
@@ -310,6 +445,94 @@ class SimplifiedAmcApi:
                 await self._change_state(ConnectionState.DISCONNECTED)
             self._ws_state_disconnecting = False
 
+    def _receive_enqueue(self, queue: asyncio.Queue, message: WSMessage):
+        """Add the received message to the queue.
+        If the queue has RECEIVE_QUEUE_SIZE messages, the queued patches are discarded and a full getStates
+        is requested. The other messages (replies of getStates, setStates, login...) are always kept."""
+        if queue.qsize() >= self.RECEIVE_QUEUE_SIZE:
+            received = []
+            while not queue.empty():
+                received.append(queue.get_nowait())
+                queue.task_done()
+            received.append(message)
+            kept = [x for x in received if x is not None and not _is_patch_message(x)]
+            discarded = sum(1 for x in received if x is not None) - len(kept)
+            if discarded:
+                self._receive_queue_overflows += 1
+                _LOGGER.warning("Receive queue full, discarded %s patches, requesting full states", discarded)
+                self._msg_quee_get_states = True
+            for queued in kept:
+                queue.put_nowait(queued)
+            if queue.empty():
+                # wake up the consumer for send the getStates
+                queue.put_nowait(None)
+        else:
+            queue.put_nowait(message)
+        self._receive_queue_max_depth = max(self._receive_queue_max_depth, queue.qsize())
+
+    async def _receive_consumer(self, ws_client, queue: asyncio.Queue) -> None:
+        """Process the messages received by _running."""
+        while True:
+            message = await queue.get()
+            try:
+                if message is not None:
+                    await self._process_message(message)
+            except Exception as error:
+                _LOGGER.exception("Error processing message data: %s, data=%s" % (error, message.data))
+            finally:
+                queue.task_done()
+
+            if self._ws_state == ConnectionState.STOPPED or self._ws_state == ConnectionState.DISCONNECTED:
+                # stop the reader too
+                await ws_client.close()
+                break
+
+            try:
+                await self._send_msg_quee()
+            except Exception as error:
+                _LOGGER.warning("Error sending queued messages: %s" % error)
+
+    def start_capture(self, path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3):
+        """Write the sent and received frames to path (JSONL, rotated at max_bytes), credentials are redacted."""
+        self.stop_capture()
+        self._capture = FrameCapture(
+            path, max_bytes, backup_count,
+            secrets=[self._login_email, self._password, self._central_username, self._central_password, self._sessionToken],
+        )
+        _LOGGER.info("Capturing websocket frames to %s", path)
+
+    def stop_capture(self):
+        if self._capture:
+            self._capture.close()
+            _LOGGER.info("Capture stopped, %s frames written to %s", self._capture.frames, self._capture.path)
+            self._capture = None
+
+    def start_trace(self, tracer: AmcTracer | None = None):
+        """Call the hooks of tracer (default an AmcTraceCollector) around the stages of the message handling."""
+        self.stop_trace()
+        self._tracer = tracer or AmcTraceCollector()
+        if isinstance(self._tracer, AmcTraceCollector):
+            self._tracer.start_loop_monitor(self._event_loop)
+        _LOGGER.info("Tracing the message handling with %s", type(self._tracer).__name__)
+
+    def stop_trace(self):
+        if self._tracer:
+            if isinstance(self._tracer, AmcTraceCollector):
+                self._tracer.stop_loop_monitor()
+            self._tracer = None
+
+    def trace_report(self) -> dict | None:
+        """Report of the AmcTraceCollector, None if not tracing."""
+        return self._tracer.report() if isinstance(self._tracer, AmcTraceCollector) else None
+
+    def receive_queue_stats(self) -> dict:
+        return {
+            "size": self.RECEIVE_QUEUE_SIZE,
+            "depth": self._receive_queue.qsize() if self._receive_queue else 0,
+            "max_depth": self._receive_queue_max_depth,
+            "overflows": self._receive_queue_overflows,
+        }
+
     
     async def _manage_running_error(self, msg, error) -> None:
         err_type = type(error).__name__
@@ -357,48 +580,50 @@ class SimplifiedAmcApi:
         backoff_attempts = self._failed_attempts - (10 + 20)
         return min(2**backoff_attempts * 60, self.MAX_RETRY_DELAY)
 
-    def _checks_pause(self):
-        self._checks_paused_to_date = self._event_loop.time() + 1
+    def _schedule_device_offline(self, deadline: float | None):
+        """Set (None clears) the end of the grace period, when the availability is checked again."""
+        self._device_online_to_date = deadline
+        if self._device_offline_handle:
+            self._device_offline_handle.cancel()
+            self._device_offline_handle = None
+        if deadline is not None:
+            self._device_offline_handle = self._event_loop.call_at(deadline, self._device_offline_start)
 
-    async def _checks(self) -> None:
-        """Execute background checks"""
-        while self._ws_state != ConnectionState.STOPPED:
-            p = self._checks_paused_to_date
-            await asyncio.sleep(0.05) #50ms
-            if p and self._checks_paused_to_date == p and p < self._event_loop.time():
-                try:
-                    if self._device_online_to_date:
-                        await self._set_device_available(True)
-                except asyncio.CancelledError:
-                    pass
-                except Exception as e:
-                    _LOGGER.error("Error in task checks: %s" % (e))
-            await asyncio.sleep(1)
+    def _device_offline_start(self):
+        self._device_offline_handle = None
+        self._create_task(self._set_device_available(True))
 
     
     def _cancel_pending_messages(self, error : Exception):
         self._ws_state_disconnecting = True
-        for id in self._messages:
-            message = self._messages[id]
+        for message in self._all_messages():
             if message.state == CommandState.STARTED:
                 message.set_ko(error)
+        self._pending_messages.clear()
 
 
     async def _set_device_available(self, call_callback):
         avaiable = self._ws_state == ConnectionState.CENTRAL_OK
         if self._device_online_to_date:
-            if not avaiable and self._device_online_to_date >= self._event_loop.time():
+            if self._device_online_to_date > self._event_loop.time():
                 avaiable = True
-            elif self._device_online_to_date < self._event_loop.time():
-                self._device_online_to_date = None
+            else:
+                self._schedule_device_offline(None)
 
         if avaiable != self._device_available:
             self._device_available = avaiable
+            self._mark_changed(None)
             if self._callback and not self._callback_get_states_disabled and call_callback:
-                await self._callback()
+                self._schedule_flush()
 
 
     async def _send_msg_quee(self):
+        if self._owner:
+            # sent by the owner of the connection, the getStates includes this central
+            if self._msg_quee_get_states:
+                self._owner._msg_quee_get_states = True
+                self._msg_quee_get_states = False
+            return await self._owner._send_msg_quee()
 
         if self._msg_quee_login or not self._sessionToken or self._ws_state == ConnectionState.CONNECTED:
             if self._ws_state in (ConnectionState.CONNECTED, ConnectionState.AUTHENTICATED, ConnectionState.CENTRAL_OK, ConnectionState.CENTRAL_KO):
@@ -418,50 +643,258 @@ class SimplifiedAmcApi:
             detailmsg = self._ws_state_detail
         if self._ws_state != wsstate or self._ws_state_detail != detailmsg:
             if wsstate in (ConnectionState.CENTRAL_OK, ConnectionState.STOPPED):
-                self._device_online_to_date = None
+                self._schedule_device_offline(None)
             elif self._ws_state == ConnectionState.CENTRAL_OK:
-                self._device_online_to_date = self._event_loop.time() + self.DEVICE_OFFLINE_DELAY
+                self._schedule_device_offline(self._event_loop.time() + self.DEVICE_OFFLINE_DELAY)
             self._ws_state = wsstate
             self._ws_state_detail = detailmsg
+            self._ws_state_event.set()
+            self._ws_state_event = asyncio.Event()
+            if wsstate == ConnectionState.STOPPED:
+                for message in self._all_messages():
+                    message.wake()
+            self._mark_changed({STATES_KEY_CONNECTION})
             await self._set_device_available(False)
             if self._callback and not self._callback_get_states_disabled:
-                await self._callback()
+                self._schedule_flush()
+            if wsstate not in (ConnectionState.CENTRAL_OK, ConnectionState.CENTRAL_KO):
+                # connection states are shared (login failures too), the central ones are set by the getStates of
+                # each central. A central failure stops only its api, detached before (see _stop_central)
+                for follower in list(self._followers.values()):
+                    follower._failed_attempts = self._failed_attempts
+                    follower._retry_delay = self._retry_delay
+                    follower._retry_from_date = self._retry_from_date
+                    if wsstate == ConnectionState.STOPPED:
+                        follower._ws_state_stop_exeception = self._ws_state_stop_exeception
+                    await follower._change_state(wsstate, detailmsg)
+
+    async def _stop_central(self, error: Exception, detailmsg: str, status: CommandMessageInfo):
+        """Stop for a failure of this central only (wrong central login, central not found).
+        A shared connection is not stopped: it's left to the other centrals, reopened by one of them
+        if this api owned it."""
+        if self._manager and (self._followers or self._owner):
+            await self._manager.detach(self)
+        self._ws_state_stop_exeception = error
+        await self._change_state(ConnectionState.STOPPED, detailmsg)
+        status.set_ko(error)
+
+    def _mark_changed(self, keys: set[str] | None):
+        """Add keys to the changed keys, None if all the states could be changed."""
+        if keys is None:
+            self._changed_keys = None
+        elif self._changed_keys is not None:
+            self._changed_keys.update(keys)
+
+    def pop_changed_keys(self) -> set[str] | None:
+        """Return the keys (see states_key) changed from the last call, None if all the states could be changed."""
+        keys = self._changed_keys
+        self._changed_keys = set()
+        return keys
 
     async def _data_changed(self):
         if self._callback and not self._callback_get_states_disabled:
             if self._central_id in self._raw_states:
                 self._raw_states[self._central_id].returned = 0            
             await self._set_device_available(False)
-            await self._callback()
+            self._schedule_flush()
+
+    def _schedule_flush(self, notify: bool = True):
+        """Flush (calculated states + callback) once after flush_delay, coalescing the updates received meanwhile."""
+        if notify and self._flush_notify_time is None:
+            self._flush_notify_time = self._event_loop.time()
+        if self._flush_handle is None:
+            self._flush_handle = self._event_loop.call_later(self.flush_delay, self._flush_start)
+
+    def _flush_start(self):
+        self._flush_handle = None
+        self._create_task(self._flush())
+
+    async def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        tracer = self._tracer
+        token = tracer.start(TRACE_FLUSH) if tracer is not None else None
+        try:
+            if self._calc_pending:
+                keys = self._calc_keys
+                self._calc_pending = False
+                self._calc_keys = set()
+                await self._set_calculated_states(keys)
+            notify_time = self._flush_notify_time
+            self._flush_notify_time = None
+            if notify_time is not None and self._callback:
+                if tracer is None:
+                    await self._callback()
+                else:
+                    callback_token = tracer.start(TRACE_CALLBACK)
+                    try:
+                        await self._callback()
+                    finally:
+                        tracer.end(TRACE_CALLBACK, callback_token)
+                now = self._event_loop.time()
+                self._flush_latencies.append(now - notify_time)
+                self.metrics.entities_updated(now)
+        except Exception as error:
+            _LOGGER.exception("Error flushing states: %s" % error)
+        finally:
+            if tracer is not None:
+                tracer.end(TRACE_FLUSH, token)
+
+    def _queue_calculated_states(self, changed_keys: set[str] | None):
+        """Calculate the states in the next flush, for all the keys received meanwhile."""
+        if changed_keys is None or self._calc_keys is None:
+            self._calc_keys = None
+        else:
+            self._calc_keys.update(changed_keys)
+        self._calc_pending = True
+        self._schedule_flush(False)
+
+    def flush_stats(self) -> dict:
+        """Latency (seconds) from the first update to the callback of the flush."""
+        return {
+            "flush_delay": self.flush_delay,
+            "count": len(self._flush_latencies),
+            **percentiles(self._flush_latencies),
+        }
+
+    def metrics_stats(self) -> dict:
+        """Rolling metrics of the commands of this central and of its connection (shared by the followers)."""
+        connection = self._owner or self
+        return {
+            **self.metrics.command_stats(),
+            **connection.metrics.connection_stats(self._event_loop.time()),
+        }
+
+    def optimistic_state(self, filter_id: str | None) -> int | None:
+        """State requested by a setStates not yet confirmed by the patches, None if nothing is pending."""
+        pending = self._optimistic.get(filter_id)
+        return pending[0] if pending else None
+
+    def optimistic_states(self) -> dict[str, int]:
+        """Requested states not yet confirmed, by filter_id."""
+        return {filter_id: pending[0] for filter_id, pending in self._optimistic.items()}
+
+    def _set_optimistic(self, group: int, index: int, state: int):
+        """Show the requested state until the patches confirm it, or the OPTIMISTIC_TIMEOUT expires."""
+        filter_id = f"{group}.{index}"
+        item = self.raw_entities.get(filter_id)
+        if item is None or (item.states.bit_on == 1) == (state == 1):
+            self._drop_optimistic(filter_id)
+            return
+        now = self._event_loop.time()
+        self._optimistic[filter_id] = (state, now, now + self.OPTIMISTIC_TIMEOUT)
+        self._schedule_optimistic_rollback()
+        self._optimistic_changed(filter_id)
+
+    def _drop_optimistic(self, filter_id: str, rollback: bool = False):
+        if self._optimistic.pop(filter_id, None) is None:
+            return
+        if rollback:
+            self._optimistic_rollbacks += 1
+        self._schedule_optimistic_rollback()
+        self._optimistic_changed(filter_id)
+
+    def _optimistic_changed(self, filter_id: str):
+        group, _, index = filter_id.partition(".")
+        self._mark_changed({states_key(int(group)), states_key(int(group), int(index))})
+        # as the other updates, not notified during the getStates of connect (the keys are kept for the next flush)
+        if self._callback and not self._callback_get_states_disabled:
+            self._schedule_flush()
+
+    def _confirm_optimistic(self):
+        """Drop the requested states reached by the entries, recording the confirmation latency."""
+        now = self._event_loop.time()
+        for filter_id, (state, request_time, _) in list(self._optimistic.items()):
+            item = self.raw_entities.get(filter_id)
+            if item is not None and (item.states.bit_on == 1) == (state == 1):
+                self._optimistic_latencies.append(now - request_time)
+                self._drop_optimistic(filter_id)
+
+    def _schedule_optimistic_rollback(self):
+        if self._optimistic_handle:
+            self._optimistic_handle.cancel()
+            self._optimistic_handle = None
+        if self._optimistic:
+            deadline = min(pending[2] for pending in self._optimistic.values())
+            self._optimistic_handle = self._event_loop.call_at(deadline, self._optimistic_rollback)
+
+    def _optimistic_rollback(self):
+        self._optimistic_handle = None
+        now = self._event_loop.time()
+        expired = [filter_id for filter_id, pending in self._optimistic.items() if pending[2] <= now]
+        for filter_id in expired:
+            _LOGGER.warning("Set state %s not confirmed for %s, rolled back", self._optimistic[filter_id][0], filter_id)
+            self._drop_optimistic(filter_id, rollback=True)
+        self._schedule_optimistic_rollback()
+
+    def _clear_optimistic(self):
+        self._optimistic_rollbacks += len(self._optimistic)
+        self._optimistic.clear()
+        self._schedule_optimistic_rollback()
+
+    def optimistic_stats(self) -> dict:
+        """Latency (seconds) from the setStates to the patch confirming it, and the states rolled back."""
+        return {
+            "timeout": self.OPTIMISTIC_TIMEOUT,
+            "pending": len(self._optimistic),
+            "confirmed": len(self._optimistic_latencies),
+            "rolled_back": self._optimistic_rollbacks,
+            **percentiles(self._optimistic_latencies),
+        }
 
 
 
 
     async def _process_message(self, message):
+        # the frame is parsed only once: the dict is kept as json model, the typed models are built from it
+        tracer = self._tracer
+        token = tracer.start(TRACE_MESSAGE) if tracer is not None else None
         try:
-            #parse_raw and parse_file are now deprecated. In Pydantic V2
-            data = AmcCommandResponse.model_validate_json(message.data, strict=False)
-        except ValueError as e:
-            failed = True
-            try:                
-                #same times arrive a wrong GET_STATES response message with only centrals!
-                if message.data and message.data.startswith(f'{{"{self._central_id}":') and "statusID" in message.data:
-                    new_data = '{"command": "getStates","status": "ok","layout": null,"centrals": ' + message.data + '}'
-                    data = AmcCommandResponse.model_validate_json(new_data, strict=False)
-                    failed = False
-                    message = WSMessage(message.type, new_data, message.extra)
-                    _LOGGER.warning("Fixed getStates message with only centrals received. data=%s" % message.data)
-            except Exception as error_fix:
-                _LOGGER.exception("Error fixing message data: %s, data=%s" % (error_fix, message.data))
-            if failed:
-                _LOGGER.warning(
-                    "Can't process data from server: %s, data=%s" % (e, message.data)
-                )
-                return
+            raw = None
+            self.metrics.received.add(self._event_loop.time(), len(message.data))
+            try:
+                if tracer is None:
+                    raw = json_loads(message.data)
+                    data = AmcCommandResponse.model_validate(raw, strict=False)
+                else:
+                    raw = _traced(tracer, TRACE_PARSE, json_loads, message.data)
+                    data = _traced(tracer, TRACE_VALIDATE, AmcCommandResponse.model_validate, raw, strict=False)
+            except ValueError as e:
+                failed = True
+                try:                
+                    #same times arrive a wrong GET_STATES response message with only centrals!
+                    if isinstance(raw, dict) and "command" not in raw and "statusID" in (raw.get(self._central_id) or {}):
+                        raw = {"command": "getStates", "status": "ok", "layout": None, "centrals": raw}
+                        data = AmcCommandResponse.model_validate(raw, strict=False)
+                        failed = False
+                        _LOGGER.warning("Fixed getStates message with only centrals received. data=%s" % message.data)
+                except Exception as error_fix:
+                    _LOGGER.exception("Error fixing message data: %s, data=%s" % (error_fix, message.data))
+                if failed:
+                    _LOGGER.warning(
+                        "Can't process data from server: %s, data=%s" % (e, message.data)
+                    )
+                    return
+
+            if data.command == AmcCommands.APPLY_PATCH or (self._followers and data.command == AmcCommands.GET_STATES):
+                raw, data = await self._route_to_followers(raw, data, message.data)
+                if raw is None:
+                    return
+            await self._process_frame(raw, data, message.data)
+        finally:
+            if tracer is not None:
+                tracer.end(TRACE_MESSAGE, token)
 
-        status = self._get_message_info(data.command)
-        status.last_message_data = message.data
+    async def _process_frame(self, raw: dict, data: AmcCommandResponse, message_data: str):
+        """Process a parsed frame: raw is the json dict, data its typed model."""
+        status = self._get_pending_message(data.command) or self._get_message_info(data.command)
+        status.set_last_message_data(message_data)
         status.response_time = self._event_loop.time()
+        if status.state == CommandState.STARTED and status.request_time is not None:
+            self.metrics.add_rtt(data.command, status.response_time - status.request_time)
+        if data.command == AmcCommands.APPLY_PATCH:
+            self.metrics.patch_received(status.response_time)
 
         match data.command:
             case AmcCommands.CHECK_CENTRALS:
@@ -482,8 +915,8 @@ class SimplifiedAmcApi:
                     status.set_ok(data.user.token)
                     self._msg_quee_get_states = True
                 else:
-                    _LOGGER.warning("Authorization failure: %s, data=%s" % (data.status, message.data))
-                    self._ws_state_stop_exeception = AuthenticationFailed(data.status or message.data)
+                    _LOGGER.warning("Authorization failure: %s, data=%s" % (data.status, message_data))
+                    self._ws_state_stop_exeception = AuthenticationFailed(data.status or message_data)
                     await self._change_state(ConnectionState.STOPPED, f"Authorization failure: : {data.status}")
                     status.set_ko(self._ws_state_stop_exeception)
             case AmcCommands.GET_STATES:
@@ -491,7 +924,7 @@ class SimplifiedAmcApi:
                 #Websocket received data: {"command":"getStates","status":"error","message":"not logged, please login"}
                 if data.status == AmcCommands.STATUS_ERROR and data.message == AmcCommands.MESSAGE_PLEASE_LOGIN:
                     if self._last_login_date + timedelta(seconds=15) < datetime.now():
-                        _LOGGER.debug("Logging after received request to relogin: %s" % (message.data))
+                        _LOGGER.debug("Logging after received request to relogin: %s" % (message_data))
                         await self._change_state(ConnectionState.CONNECTED, "Received request to relogin")
                         self._msg_quee_login = True
                         self._msg_quee_get_states = True
@@ -500,10 +933,8 @@ class SimplifiedAmcApi:
                     return
 
                 if not self._central_id in data.centrals:
-                    _LOGGER.warning("GetStates failure, central not found: %s, data=%s" % (data.status, message.data))
-                    self._ws_state_stop_exeception = AmcCentralNotFoundException("User login is fine but can't find AMC Central.")
-                    await self._change_state(ConnectionState.STOPPED, "Central not found")
-                    status.set_ko(self._ws_state_stop_exeception)
+                    _LOGGER.warning("GetStates failure, central not found: %s, data=%s" % (data.status, message_data))
+                    await self._stop_central(AmcCentralNotFoundException("User login is fine but can't find AMC Central."), "Central not found", status)
                     return
                 
                 #if self._central_pin and data.status == AmcCommands.STATUS_OK:  # only for amcProtoVer >= 2
@@ -532,11 +963,15 @@ class SimplifiedAmcApi:
                         if states.users(self._central_id) or self.amcProtoVer >= 2:
                             self.pin_required = True
 
-                    self.raw_states_json_model = json.loads(message.data)
-                    self._raw_states = data.centrals
+                    self._set_raw_states(data.centrals)
+                    self._sync_notifications()
+                    self._mark_changed(None)
                     self._raw_states_central_valid = True
                     self._raw_states_centralstatus_valid = True
+                    self.last_states_time = self._event_loop.time()
                     self._failed_attempts = 0
+                    self._calc_pending = False
+                    self._calc_keys = set()
                     await self._set_calculated_states()
                     status.set_ok(data.centrals)
                     await self._change_state(ConnectionState.CENTRAL_OK)
@@ -549,51 +984,61 @@ class SimplifiedAmcApi:
                     if status_new:
                         self._raw_states_centralstatus_valid = True
                     if status_new != status_old:
-                        _LOGGER.debug("Error getting states (%s): %s" % (status_new, message.data))
+                        _LOGGER.debug("Error getting states (%s): %s" % (status_new, message_data))
                         if not self._central_id in self._raw_states:
-                            self._raw_states = data.centrals
-                            self.raw_states_json_model = json.loads(message.data)
-                        self.raw_states_json_model["centrals"][self._central_id]["statusID"] = statusID_new
-                        self.raw_states_json_model["centrals"][self._central_id]["status"] = status_new
+                            self._set_raw_states(data.centrals)
                         self._raw_states[self._central_id].statusID = statusID_new
                         self._raw_states[self._central_id].status = status_new
+                        self._mark_changed(None)
                     # {"command":"getStates","status":"ok","layout":null,"centrals":{"XXX":{"amcProtoVer":2,"realName":"X864V","statusID":0,"status":"wrong login X864V/4.10"}}}
                     if status_new and status_new.startswith("wrong login"):                        
-                        _LOGGER.warning("Central Authorization failure: %s, data=%s" % (data.status, message.data))
-                        self._ws_state_stop_exeception = AuthenticationFailed(f"Central Authorization failure: {status_new}")
-                        await self._change_state(ConnectionState.STOPPED, f"Central Authorization failure: {status_new}")
-                        status.set_ko(self._ws_state_stop_exeception)
+                        _LOGGER.warning("Central Authorization failure: %s, data=%s" % (data.status, message_data))
+                        await self._stop_central(AuthenticationFailed(f"Central Authorization failure: {status_new}"), f"Central Authorization failure: {status_new}", status)
                     else:
                         await self._change_state(ConnectionState.CENTRAL_KO, f"Central {status_new}")
-                        status.set_ko(AmcCentralStatusErrorException("Central " + status_new) if status_new else AmcException(message.data))
+                        status.set_ko(AmcCentralStatusErrorException("Central " + status_new) if status_new else AmcException(message_data))
                 else:
-                    _LOGGER.warning("Error getting states: %s, data=%s" % (data.centrals, message.data))
-                    status.set_ko(AmcException(message.data))
+                    _LOGGER.warning("Error getting states: %s, data=%s" % (data.centrals, message_data))
+                    status.set_ko(AmcException(message_data))
                     await self._change_state(ConnectionState.DISCONNECTED, f"Central States Status {data.status}")
             case AmcCommands.APPLY_PATCH:
                 if self._ws_state != ConnectionState.CENTRAL_OK:
                     self._msg_quee_get_states = True
                     return
+                self.last_patch_time = self._event_loop.time()
                 try:
-                    path_json_model = json.loads(message.data)
-                    for patch in path_json_model["patch"]:
+                    patched_keys: set[str] | None = set()
+                    tracer = self._tracer
+                    for patch in raw["patch"]:
                         try:
-                            self.raw_states_json_model = await self._process_json_patch(self.raw_states_json_model, patch)
+                            if tracer is None:
+                                await self._process_json_patch(self._raw_states, patch)
+                            else:
+                                token = tracer.start(TRACE_JSON_PATCH)
+                                try:
+                                    await self._process_json_patch(self._raw_states, patch)
+                                finally:
+                                    tracer.end(TRACE_JSON_PATCH, token)
+                            keys = _patch_changed_keys(patch["path"])
                         except Exception as e:
-                            _LOGGER.warning("Can't process patch from server: %s, patch=%s, data=%s" % (e, patch, message.data))
+                            #the states can't follow the patch: valid again with the next getStates
+                            _LOGGER.warning("Can't process patch from server: %s, patch=%s, data=%s" % (e, patch, message_data))
                             self._msg_quee_get_states = True
-                    states_json = json.dumps(self.raw_states_json_model)
-                    states_data = AmcCommandResponse.model_validate_json(states_json, strict=False)
-                    #_LOGGER.warning("Applied patch: patch=%s, data=%s, old_data=%s" % (message.data, states_json, self.message_getstates_ok_data))
-                    self._raw_states = states_data.centrals
-                    await self._set_calculated_states()
+                            self.last_patch_error_time = self._event_loop.time()
+                            keys = None
+                        self._mark_changed(keys)
+                        patched_keys = None if keys is None or patched_keys is None else patched_keys | keys
+                    if patched_keys is None or states_key(CentralDataSections.NOTIFICATIONS) in patched_keys:
+                        self._sync_notifications()
+                    self._queue_calculated_states(patched_keys)
                     await self._data_changed()
                 except Exception as ee:
-                    _LOGGER.warning("Can't process patch from server: %s, data=%s" % (ee, message.data))
-                    self._msg_quee_get_states = True                
+                    _LOGGER.warning("Can't process patch from server: %s, data=%s" % (ee, message_data))
+                    self._msg_quee_get_states = True
+                    self.last_patch_error_time = self._event_loop.time()
             case _:
-                _LOGGER.warning("Unknown command received from server : %s, data=%s" % (data, message.data))
-                status.set_ko(AmcException(f"Unknown command received from server : {data.command} - {message.data}"))
+                _LOGGER.warning("Unknown command received from server : %s, data=%s" % (data, message_data))
+                status.set_ko(AmcException(f"Unknown command received from server : {data.command} - {message_data}"))
 
 
     def _get_entity_state(self, group: int, index: int) -> bool:
@@ -602,58 +1047,140 @@ class SimplifiedAmcApi:
         return item.states.bit_on == 1
         
 
-    async def _set_calculated_states(self):
-        state = AmcStatesParser(self.raw_states())
+    async def _set_calculated_states(self, changed_keys: set[str] | None = None):
+        """Calculate arm_state of groups, areas and zones.
+        If changed_keys (see states_key) is passed, only the entries depending on them are recalculated."""
+        tracer = self._tracer
+        token = tracer.start(TRACE_CALCULATED_STATES) if tracer is not None else None
+        try:
+            self.states_version += 1
+            if changed_keys is None or not self._set_calculated_states_partial(changed_keys):
+                self._set_calculated_states_full()
+            if self._optimistic:
+                self._confirm_optimistic()
+        finally:
+            if tracer is not None:
+                tracer.end(TRACE_CALCULATED_STATES, token)
+
+        for key in list(self._pending_messages):
+            for message in self._get_pending_messages(key):
+                if message.msg and message.msg.command=="setStates":
+                    new_state = self._get_entity_state(message.msg.group, message.msg.index)
+                    if new_state == message.msg.state:
+                        message.response_time = self._event_loop.time()
+                        self.metrics.add_rtt(message.msg.command, message.response_time - message.request_time)
+                        message.set_ok(new_state)
+
+
+        
+                
+    def _set_calculated_states_full(self):
+        state = AmcStatesParser(self.raw_states(), self.states_version)
         groups = state.groups(self._central_id).list
         areas = state.areas(self._central_id).list
         zones = state.zones(self._central_id).list
         outputs = state.outputs(self._central_id).list
-        all_entries = [*zones, *areas, *groups]
-        for item in [*all_entries, *outputs]:
+        entries = [*zones, *areas, *groups, *outputs]
+        for item in entries:
             item.filter_id = f"{item.group}.{item.index}"
             self.raw_entities[item.filter_id] = item
-        self.armed_any = False
-        for item in [*groups, *areas]:
-            item.arm_state = AmcAlarmState.Armed if item.states.bit_on == 1 else AmcAlarmState.Disarmed
-            self.armed_any = self.armed_any or item.arm_state == AmcAlarmState.Armed
-        for item in zones:
-            item.arm_state = AmcAlarmState.Armed if item.states.bit_armed == 1 and item.states.bit_on == 1 else AmcAlarmState.Disarmed
-        if self.armed_any:
-            any_arming = False
-            for item in areas:
+        # entries removed from the central
+        for filter_id in self.raw_entities.keys() - {item.filter_id for item in entries}:
+            del self.raw_entities[filter_id]
+        self._build_arm_index(groups, areas, zones)
+        self.state_table.rebuild([*groups, *areas, *zones, *outputs], self._area_zones, self._group_areas)
+
+        self._armed_ids = {item.filter_id for item in [*groups, *areas] if item.states.bit_on == 1}
+        self.armed_any = len(self._armed_ids) > 0
+        self._calc_arm_states([
+            *((CentralDataSections.GROUPS, item) for item in groups),
+            *((CentralDataSections.AREAS, item) for item in areas),
+            *((CentralDataSections.ZONES, item) for item in zones),
+        ])
+
+    def _set_calculated_states_partial(self, changed_keys: set[str]) -> bool:
+        """Recalculate only the subtree of the changed entries, False if a full recalculation is needed."""
+        sections = (CentralDataSections.GROUPS, CentralDataSections.AREAS, CentralDataSections.ZONES)
+        todo: dict[str, tuple[int, AmcEntry]] = {}
+        for key in changed_keys:
+            section, _, index = key.partition(".")
+            if not index or int(section) not in AmcStateTable.SECTIONS:
+                continue
+            item = self.raw_entities.get(key)
+            if item is None or not self.state_table.update(item):
+                return False
+            section = int(section)
+            if section not in sections:
+                continue
+            todo[key] = (section, item)
+            if section == CentralDataSections.AREAS:
                 #notification is only for area, then search parents group and childs zones
-                if item.arm_state == AmcAlarmState.Armed and self._is_state_arming(item):
-                    item.arm_state = AmcAlarmState.Arming
-                    any_arming = True
-                    id_str = item.filter_id
-                    filtered_entries = [ e for e in zones if e.filters and id_str in e.filters and e.arm_state == AmcAlarmState.Armed ] 
-                    for e in filtered_entries: 
-                        e.arm_state = AmcAlarmState.Arming
-
-            if any_arming:
-                for item in groups:
-                    if item.arm_state == AmcAlarmState.Armed:
-                        id_str = item.filter_id                
-                        if any(e.filters and id_str in e.filters and e.arm_state == AmcAlarmState.Arming for e in areas):
-                            item.arm_state = AmcAlarmState.Arming            
-
-            for item in all_entries:
-                if item.arm_state == AmcAlarmState.Arming and item.states.anomaly == 1:
-                    item.arm_state = AmcAlarmState.ArmingWithProblem
-                if item.arm_state == AmcAlarmState.Armed and item.states.anomaly == 1:
-                    item.arm_state = AmcAlarmState.Triggered
-
-        for id in self._messages:
-            message = self._messages[id]
-            if message.state == CommandState.STARTED and message.msg and message.msg.command=="setStates":
-                new_state = self._get_entity_state(message.msg.group, message.msg.index)
-                if new_state == message.msg.state:
-                    message.response_time = self._event_loop.time()
-                    message.set_ok(new_state)
+                for e in self._area_groups.get(key, ()):
+                    todo[e.filter_id] = (CentralDataSections.GROUPS, e)
+                for e in self._area_zones.get(key, ()):
+                    todo[e.filter_id] = (CentralDataSections.ZONES, e)
+            if section != CentralDataSections.ZONES:
+                if item.states.bit_on == 1:
+                    self._armed_ids.add(key)
+                else:
+                    self._armed_ids.discard(key)
+        if self.armed_any != (len(self._armed_ids) > 0):
+            #all zones depend from armed_any
+            return False
+        self._calc_arm_states(todo.values())
+        return True
+
+    def _build_arm_index(self, groups: list[AmcEntry], areas: list[AmcEntry], zones: list[AmcEntry]):
+        """Hierarchy group -> areas -> zones from the filters of the entries."""
+        group_ids = {item.filter_id for item in groups}
+        area_by_id = {item.filter_id: item for item in areas}
+        group_by_id = {item.filter_id: item for item in groups}
+        self._group_areas = {}
+        self._area_groups = {}
+        self._area_zones = {}
+        self._zone_areas = {}
+        for item in areas:
+            for f in set(item.filters or ()):
+                if f in group_ids:
+                    self._group_areas.setdefault(f, []).append(item)
+                    self._area_groups.setdefault(item.filter_id, []).append(group_by_id[f])
+        for item in zones:
+            for f in set(item.filters or ()):
+                if f in area_by_id:
+                    self._zone_areas.setdefault(item.filter_id, []).append(area_by_id[f])
+                    self._area_zones.setdefault(f, []).append(item)
+
+    def _calc_arm_states(self, items):
+        """Set arm_state for (section, entry) items, marking the changed ones."""
+        for section, item in items:
+            arm_state = self._calc_arm_state(section, item)
+            if item.arm_state != arm_state:
+                item.arm_state = arm_state
+                self._mark_changed({states_key(section), item.filter_id})
+
+    def _calc_arm_state(self, section: int, item: AmcEntry) -> AmcAlarmState:
+        states = item.states
+        if section == CentralDataSections.ZONES:
+            armed = states.bit_armed == 1 and states.bit_on == 1
+        else:
+            armed = states.bit_on == 1
+        if not armed:
+            return AmcAlarmState.Disarmed
+        if not self.armed_any:
+            return AmcAlarmState.Armed
+        if section == CentralDataSections.AREAS:
+            arming = self._is_state_arming(item)
+        elif section == CentralDataSections.ZONES:
+            arming = any(self._is_area_arming(e) for e in self._zone_areas.get(item.filter_id, ()))
+        else:
+            arming = any(self._is_area_arming(e) for e in self._group_areas.get(item.filter_id, ()))
+        if arming:
+            return AmcAlarmState.ArmingWithProblem if states.anomaly == 1 else AmcAlarmState.Arming
+        return AmcAlarmState.Triggered if states.anomaly == 1 else AmcAlarmState.Armed
 
+    def _is_area_arming(self, entry: AmcEntry) -> bool:
+        return entry.states.bit_on == 1 and self._is_state_arming(entry)
 
-        
-                
     def _is_state_arming(self, entry):
         if entry.notifications and len(entry.notifications) > 0:
             msg = entry.notifications[0].name.strip()
@@ -665,8 +1192,8 @@ class SimplifiedAmcApi:
         return False
 
 
-    async def _process_json_patch(self, data, p):
-        """Apply a list of JSON patches to a dict without using jsonpatch."""
+    async def _process_json_patch(self, states: dict[str, AmcCentralResponse], p: dict):
+        """Apply a JSON patch to the typed states, without using jsonpatch."""
 
         # Examples:
         # { "op": "replace", "path": "/centrals/10EF60834A5436323003323338310000/data/2/list/19/states", "value": {"redalert":0,"progress":0,"bit_showHide":1,"bit_on":1,"bit_exludable":1,"bit_armed":0,"anomaly":1,"bit_opened":1,"bit_notReady":0,"video":0} }
@@ -674,45 +1201,144 @@ class SimplifiedAmcApi:
         # { "op": "add", "path": "/centrals/10EF60834A5436323003323338310000/data/5/list/0", "value": {"command":"notification","name":"Inibizione balcone tamper","category":4,"serverDate":"Thu, 18 Sep 2025 10:10:33 +0200","centralDate":"2025-09-17 10:13:43 +0000","centralGroup":2,"centralIndex":23,"states":{"anomaly":1,"bit_showHide":1,"redalert":1}} }
         # { "op": "replace", "path": "/centrals/10EF60834A5436323003323338310000/data/5/unvisited", "value": "8" }
 
-        #for p in patch:
+        # Only the patched value is validated. Paths outside the fields of the models are ignored
+        # (as the validation of getStates does), AmcPatchModelException is raised when the typed
+        # states can't follow the patch.
         op = p["op"]
-        path = p["path"].strip("/").split("/")
-        value = p.get("value")
+        path = _split_patch_path(p["path"])
+        if path[0] != "centrals":
+            raise AmcPatchModelException(f"Patch path outside the centrals: {p['path']}")
 
         # naviga nell'albero fino al penultimo nodo
-        target = data
-        for key in path[:-1]:
-            if key.isdigit():
-                key = int(key)
-                if isinstance(target, list):
-                    key = _find_pos_by_item_index(target, key)
-            target = target[key]
+        target = states
+        target_type = dict[str, AmcCentralResponse]
+        for key in path[1:-1]:
+            target, target_type = self._model_child(target, target_type, key)
+            if target is _MODEL_NOT_MAPPED:
+                return
+            if target is None:
+                raise AmcPatchModelException(f"Typed states not found for patch {p['path']}")
 
+        # the last key of a list is the position
         last_key = path[-1]
-        if last_key.isdigit():
-            last_key = int(last_key)
-            if op in ("replace", "remove") and isinstance(target, list):
-                key = _find_pos_by_item_index(target, key)
+        if isinstance(last_key, int) and not isinstance(target, list):
+            last_key = str(last_key)
+        if isinstance(target, BaseModel):
+            field = type(target).model_fields.get(last_key)
+            if field is None:
+                return
+            value_type = _unwrap_optional(field.annotation)
+        else:
+            args = get_args(target_type)
+            value_type = (args[0] if isinstance(target, list) else args[1]) if args else Any
 
         # operazioni base
         if op == "add" and isinstance(target, list) and isinstance(last_key, int):
-            target.insert(last_key, value)
+            target.insert(last_key, _type_adapter(value_type).validate_python(p.get("value")))
+            self._list_positions_changed(target, last_key, op)
         elif op == "add" or op == "replace":
-            if op == "replace" and isinstance(target[last_key], dict):
-                new_value = target[last_key]                    
-                new_value.update(value)
-                value = new_value
-            target[last_key] = value
+            value = p.get("value")
+            if op == "replace":
+                # objects are merged with the current value
+                current = _model_get(target, last_key)
+                if isinstance(value, dict) and isinstance(current, (BaseModel, dict)):
+                    value = {**(current.__dict__ if isinstance(current, BaseModel) else current), **value}
+            _model_set(target, last_key, _type_adapter(value_type).validate_python(value))
         elif op == "remove":
             if isinstance(target, list) and isinstance(last_key, int):
                 target.pop(last_key)
-            else:
+                self._list_positions_changed(target, last_key, op)
+            elif isinstance(target, dict):
                 target.pop(last_key, None)
-
+            elif not field.is_required():
+                setattr(target, last_key, None)
+            else:
+                raise AmcPatchModelException(f"Can't remove field {last_key}")
         else:
             raise ValueError(f"Operazione non supportata: {op}")
-        
-        return data
+
+        if op == "add" and isinstance(target, list) and len(target) > self.notifications.maxlen and _is_notifications_path(path):
+            # the cloud only adds notifications, keep the lists bounded
+            del target[self.notifications.maxlen:]
+
+    def _model_child(self, model, model_type, key):
+        """Follow one step of a patch path on the typed states, returns (child, child_type).
+        child is None if not found, _MODEL_NOT_MAPPED if the path is outside the fields of the models."""
+        if isinstance(model, BaseModel):
+            field = type(model).model_fields.get(key) if isinstance(key, str) else None
+            if field is None:
+                return _MODEL_NOT_MAPPED, None
+            return getattr(model, key), _unwrap_optional(field.annotation)
+        args = get_args(model_type)
+        if isinstance(model, list):
+            # list: by item index
+            pos = self._list_pos(model, key) if isinstance(key, int) else None
+            if pos is None:
+                return None, None
+            return model[pos], _unwrap_optional(args[0]) if args else Any
+        if isinstance(model, dict):
+            # dict: numeric keys as string (e.g. users by PIN)
+            key = str(key)
+            if key not in model:
+                return None, None
+            return model[key], _unwrap_optional(args[1]) if len(args) == 2 else Any
+        return None, None
+
+    def _list_pos(self, lst: list, index: int) -> int | None:
+        """Position in lst of the item with "index" == index, from the positions index of the list."""
+        entry = self._list_positions.get(id(lst))
+        if entry is not None and entry[0] is lst:
+            pos = entry[1].get(index)
+            # the position is verified, if the list is changed outside of the patches the index is rebuilt
+            if pos is not None and pos < len(lst) and _item_index(lst[pos]) == index:
+                return pos
+        positions = _list_positions(lst)
+        self._list_positions[id(lst)] = (lst, positions)
+        return positions.get(index)
+
+    def _list_positions_changed(self, lst: list, pos: int, op: str):
+        """Item added or removed at pos: positions of the following items are changed."""
+        entry = self._list_positions.get(id(lst))
+        if entry is None or entry[0] is not lst:
+            return
+        if op == "add" and pos == len(lst) - 1:
+            # appended, the others don't move
+            index = _item_index(lst[pos])
+            if index is not None:
+                entry[1].setdefault(index, pos)
+        else:
+            self._list_positions.pop(id(lst))
+
+    def set_notifications_max(self, maxlen: int):
+        self.notifications = AmcNotificationStore(maxlen)
+        self._sync_notifications()
+
+    def _sync_notifications(self):
+        central = self._raw_states.get(self._central_id) if self._raw_states else None
+        if central is None or not central.data:
+            return
+        section = next((s for s in central.data if s.index == CentralDataSections.NOTIFICATIONS), None)
+        if section is not None:
+            self.notifications.sync(section.list)
+
+    def _set_raw_states(self, states: dict[str, AmcCentralResponse]):
+        self._raw_states = states
+        self._list_positions.clear()
+
+    @property
+    def raw_states_json_model(self) -> dict | None:
+        """The states as a getStates response, serialized on demand: the typed states are the only copy kept."""
+        if not self._raw_states:
+            return None
+        return {
+            "command": AmcCommands.GET_STATES,
+            "status": AmcCommands.STATUS_OK,
+            "layout": None,
+            "centrals": {
+                central_id: central.model_dump(mode="json", exclude_none=True)
+                for central_id, central in self._raw_states.items()
+            },
+        }
 
     async def _login(self) -> CommandMessageInfo:
         self._sessionToken = None
@@ -725,8 +1351,9 @@ class SimplifiedAmcApi:
         )
         return await self._send_message(login_message)
 
-    async def _get_message_info_result(self, message: CommandMessageInfo, timeout : int = 30):        
-        for _ in range(timeout):  # Wait 30 secs
+    async def _get_message_info_result(self, message: CommandMessageInfo, timeout : int = None):
+        end_time = self._event_loop.time() + (timeout if timeout is not None else self.COMMAND_TIMEOUT)
+        while True:
             if self._ws_state in [
                 ConnectionState.STOPPED,
             ]:
@@ -735,12 +1362,14 @@ class SimplifiedAmcApi:
                 return message.result
             if message.state == CommandState.KO:
                 break
-            await asyncio.sleep(1)
+            remaining = end_time - self._event_loop.time()
+            if remaining <= 0 or not await message.wait(remaining):
+                break
         if message.error:
             raise message.error
         if self._ws_state_stop_exeception:
             raise self._ws_state_stop_exeception
-        if self._listen_task.done() and issubclass(
+        if self._listen_task and self._listen_task.done() and issubclass(
             self._listen_task.exception().__class__, AmcException
         ):
             raise self._listen_task.exception()  # Something known happened in the listener
@@ -749,27 +1378,71 @@ class SimplifiedAmcApi:
 
 
     def _get_message_info(self, key: str) -> CommandMessageInfo:
+        """Last message for key."""
         if not key in self._messages:
+            self._messages_seq += 1
             status = CommandMessageInfo()
+            status.id = self._messages_seq
             status.key = key
             self._messages[key] = status
         return self._messages[key]
 
-    async def _send_message(self, msg: AmcCommand, status: CommandMessageInfo = None) -> CommandMessageInfo:
+    def _new_message_info(self, key: str) -> CommandMessageInfo:
+        """Message for a new command, added to the in-flight commands of key.
+        The last message is reused if not in flight, so who is waiting it receives the new result."""
+        status = self._get_message_info(key)
+        if status.state == CommandState.STARTED:
+            del self._messages[key]
+            status = self._get_message_info(key)
+        pending = self._get_pending_messages(key)
+        pending.append(status)
+        return status
+
+    def _get_pending_messages(self, key: str) -> deque[CommandMessageInfo]:
+        """In-flight messages for key, completed messages are removed and expired ones set to KO."""
+        pending = self._pending_messages.get(key)
+        if pending is None:
+            pending = self._pending_messages[key] = deque()
+        elif pending:
+            expire_time = self._event_loop.time() - self.COMMAND_TIMEOUT
+            for status in list(pending):
+                if status.state == CommandState.STARTED and status.request_time is not None and status.request_time < expire_time:
+                    status.set_ko(asyncio.TimeoutError("Response for command %s non received after timeout" % key))
+            if any(status.state != CommandState.STARTED for status in pending):
+                pending = self._pending_messages[key] = deque(x for x in pending if x.state == CommandState.STARTED)
+        return pending
+
+    def _get_pending_message(self, key: str) -> CommandMessageInfo | None:
+        """Oldest in-flight message for key, the one a response must be correlated to."""
+        pending = self._get_pending_messages(key)
+        return pending[0] if pending else None
+
+    def _all_messages(self) -> set[CommandMessageInfo]:
+        res = set(self._messages.values())
+        for pending in self._pending_messages.values():
+            res.update(pending)
+        return res
+
+    async def _send_message(self, msg: AmcCommand, status: CommandMessageInfo = None, key: str = None) -> CommandMessageInfo:
         if not status:
-            status = self._get_message_info(msg.command)
-        status.state = CommandState.STARTED
+            status = self._new_message_info(key or msg.command)
+        status.set_started()
         status.request_time = self._event_loop.time()
-        status.error = None
         status.msg = msg
 
         payload = ""
+        connection = self._owner or self
         try:
-            if self._sessionToken:
-                msg.token = self._sessionToken
+            if connection._sessionToken:
+                msg.token = connection._sessionToken
             payload = msg.json(exclude_none=True, exclude_unset=True)
             _LOGGER.debug("Websocket sending data: %s", payload)
-            await self._websocket.send_str(payload)
+            if not connection._websocket:
+                raise aiohttp.ClientConnectionError("Websocket not connected")
+            await connection._websocket.send_str(payload)
+            connection.metrics.sent.add(self._event_loop.time(), len(payload))
+            if self._capture:
+                self._capture.write("out", payload)
         except (aiohttp.ClientConnectionError, asyncio.TimeoutError, aiohttp.client_exceptions.ClientConnectionResetError) as error:
             if not self._send_message_retrying:
                 try:
@@ -787,32 +1460,95 @@ class SimplifiedAmcApi:
                     await asyncio.sleep(0.2)
                     self._send_message_retrying = False
                     
-            status.state = CommandState.KO
-            status.error = error
             status.response_time = self._event_loop.time()
+            status.set_ko(error)
             raise error
         except Exception as error:
-            status.state = CommandState.KO
-            status.error = error
             status.response_time = self._event_loop.time()
+            status.set_ko(error)
             raise error
         return status
 
     async def command_get_states(self) -> CommandMessageInfo:
+        # one getStates for all the centrals sharing the connection
+        owner = self._owner or self
         return await self._send_message(
             AmcCommand(
                 command="getStates",
                 centrals=[
                     AmcCentral(
-                        centralID=self._central_id,
-                        centralUsername=self._central_username,
-                        centralPassword=self._central_password,
+                        centralID=api._central_id,
+                        centralUsername=api._central_username,
+                        centralPassword=api._central_password,
                     )
+                    for api in (owner, *owner._followers.values())
                 ],
             )
         )
 
-    async def command_set_states(self, group: int, index: int, state: int, userPIN: str):
+    def _add_follower(self, api: "SimplifiedAmcApi"):
+        """Share this connection with the api of another central of the same account."""
+        api._owner = self
+        self._followers[api._central_id] = api
+        if self._ws_state in (ConnectionState.CENTRAL_OK, ConnectionState.CENTRAL_KO):
+            # the new central is added to the next getStates
+            self._msg_quee_get_states = True
+
+    def _remove_follower(self, api: "SimplifiedAmcApi"):
+        if self._followers.get(api._central_id) is api:
+            del self._followers[api._central_id]
+        api._owner = None
+
+    async def _route_to_followers(self, raw: dict, data: AmcCommandResponse, message_data: str) -> tuple[dict | None, AmcCommandResponse | None]:
+        """Process the parts of a getStates or applyPatch for the centrals of the followers.
+        The patches of other centrals (e.g. of a follower detached) are dropped.
+        Return the part left to this central, None if nothing is left."""
+        if data.command == AmcCommands.GET_STATES:
+            if data.centrals:
+                # centrals of the getStates this response is for, a follower added later is not in it
+                request = (self._get_pending_message(data.command) or self._get_message_info(data.command)).msg
+                requested = {x.centralID for x in request.centrals or []} if request else set()
+
+                def _part(central_id):
+                    # a central missing in the response gets an empty part: "central not found" for it only
+                    centrals = {central_id: raw["centrals"][central_id]} if central_id in data.centrals else {}
+                    return (
+                        {**raw, "centrals": centrals},
+                        data.model_copy(update={"centrals": {k: data.centrals[k] for k in centrals}}),
+                    )
+
+                for central_id, follower in list(self._followers.items()):
+                    if central_id in data.centrals or central_id in requested:
+                        await follower._process_frame(*_part(central_id), message_data)
+                if len(data.centrals) > 1 or self._central_id not in data.centrals:
+                    raw, data = _part(self._central_id)
+        else:
+            own = []
+            patches: dict[str, list[dict]] = {}
+            received = raw.get("patch") or []
+            for patch in received:
+                central_id = _patch_central_id(patch.get("path") or "")
+                if central_id == self._central_id:
+                    own.append(patch)
+                elif central_id in self._followers:
+                    patches.setdefault(central_id, []).append(patch)
+            dropped = len(received) - len(own) - sum(len(x) for x in patches.values())
+            if dropped:
+                _LOGGER.debug("Dropped %s patches of centrals not handled by this connection", dropped)
+            for central_id, follower_patch in patches.items():
+                await self._followers[central_id]._process_frame({**raw, "patch": follower_patch}, data, message_data)
+            if len(own) != len(received):
+                raw = {**raw, "patch": own} if own else None
+                data = data if own else None
+
+        if any(follower._msg_quee_get_states for follower in self._followers.values()):
+            # states requested by a follower (e.g. patch not applicable), sent by this connection
+            for follower in self._followers.values():
+                follower._msg_quee_get_states = False
+            self._msg_quee_get_states = True
+        return raw, data
+
+    def _get_user_idx(self, userPIN: str) -> int | None:
         userIdx=None
         if self.pin_required:
             if not userPIN:
@@ -823,25 +1559,67 @@ class SimplifiedAmcApi:
             userIdx=user.index
         elif userPIN:
             raise Exception("PIN not allowed.")
+        return userIdx
+
+    async def _send_set_states(self, group: int, index: int, state: int, userPIN: str, userIdx: int | None) -> CommandMessageInfo:
+        self._set_optimistic(group, index, state)
+        try:
+            return await self._send_message(
+                AmcCommand(
+                    command="setStates",
+                    centralID=self._central_id,
+                    centralUsername=self._central_username,
+                    centralPassword=self._central_password,
+                    group=group,
+                    index=index,
+                    state=True if state == 1 else False,
+                    userPIN=userPIN,
+                    userIdx=userIdx
+                ),
+                key=f"setStates_{group}_{index}"
+            )
+        except Exception:
+            self._drop_optimistic(f"{group}.{index}", rollback=True)
+            raise
+
+    async def command_set_states(self, group: int, index: int, state: int, userPIN: str):
+        userIdx = self._get_user_idx(userPIN)
         
         #waiting for state, if is in reconnecting state, device is avaiable but is reconnecting
         await self._ensure_central_ok()
-        status = self._get_message_info(f"setStates_{group}_{index}")
 
-        await self._send_message(
-            AmcCommand(
-                command="setStates",
-                centralID=self._central_id,
-                centralUsername=self._central_username,
-                centralPassword=self._central_password,
-                group=group,
-                index=index,
-                state=True if state == 1 else False,
-                userPIN=userPIN,
-                userIdx=userIdx
-            ),
-            status
-        )
+        return await self._send_set_states(group, index, state, userPIN, userIdx)
+
+    async def command_set_states_batch(
+        self, entries: list[AmcEntry], state: int, userPIN: str, timeout: float = None
+    ) -> dict[str, Exception | None]:
+        """Send setStates for all entries concurrently and wait the confirmation from the patches.
+        Entries included in an entry already sent (by filters, e.g. an area of a sent group) are skipped:
+        pass the groups before the areas.
+        Returns filter_id -> None if confirmed, otherwise the error."""
+        userIdx = self._get_user_idx(userPIN)
+        await self._ensure_central_ok()
+
+        processed_ids = set()
+        to_send: list[AmcEntry] = []
+        for amc_entry in entries:
+            #if selected an area included in a group, ignore it
+            if amc_entry.filter_id in processed_ids:
+                continue
+            if amc_entry.filters and any(f in processed_ids for f in amc_entry.filters):
+                continue
+            processed_ids.add(amc_entry.filter_id)
+            to_send.append(amc_entry)
+
+        async def _set_states(amc_entry: AmcEntry):
+            message = await self._send_set_states(amc_entry.group, amc_entry.index, state, userPIN, userIdx)
+            return await self._get_message_info_result(message, timeout)
+
+        results = await asyncio.gather(*[_set_states(e) for e in to_send], return_exceptions=True)
+        return {
+            e.filter_id: res if isinstance(res, BaseException) else None
+            for e, res in zip(to_send, results)
+        }
     
     def raw_states(self) -> dict[str, AmcCentralResponse]:
         return self._raw_states
@@ -853,6 +1631,8 @@ class SimplifiedAmcApi:
             "ws_state_detail": self._ws_state_detail,
             "central_status": getattr(central_data, "status", None),
             "central_statusID": getattr(central_data, "statusID", None),
+            "connection": "shared" if self._owner else ("owner" if self._followers else "own"),
+            "connection_centrals": 1 + len((self._owner or self)._followers),
             "failed_attempts": self._failed_attempts,
             "retry_delay_seconds": self._retry_delay,
             "retry_from_date": self._retry_from_date
@@ -861,52 +1641,266 @@ class SimplifiedAmcApi:
     
 
 
+class AmcConnectionManager:
+    """Share one websocket connection (one login) among the apis of the centrals of the same account.
+    The first api attached owns the connection: it requests the states of all the centrals with
+    one getStates and routes the received states and patches to the api of each central.
+    When the owner is detached, the connection is reopened by one of the others."""
+
+    def __init__(self):
+        self._owners: dict[tuple, SimplifiedAmcApi] = {}
+
+    @staticmethod
+    def _key(api: SimplifiedAmcApi) -> tuple:
+        return (api._ws_url, (api._login_email or "").strip().lower(), api._password)
+
+    def attach(self, api: SimplifiedAmcApi):
+        """Use the connection of the account of api, before connecting it."""
+        api._manager = self
+        key = self._key(api)
+        owner = self._owners.get(key)
+        if owner is None:
+            self._owners[key] = api
+        elif owner is not api and owner._central_id != api._central_id:
+            owner._add_follower(api)
+
+    async def detach(self, api: SimplifiedAmcApi):
+        api._manager = None
+        key = self._key(api)
+        owner = self._owners.get(key)
+        if owner is None:
+            return
+        if owner is not api:
+            owner._remove_follower(api)
+            return
+        followers = list(api._followers.values())
+        for follower in followers:
+            api._remove_follower(follower)
+        if not followers:
+            del self._owners[key]
+            return
+        owner = self._owners[key] = followers[0]
+        for follower in followers[1:]:
+            owner._add_follower(follower)
+        if owner._ws_state != ConnectionState.STOPPED:
+            _LOGGER.debug("Connection of %s reopened by central %s", api._login_email, owner._central_id)
+            owner._msg_quee_get_states = True
+            await owner._change_state(ConnectionState.DISCONNECTED, "Connection owner removed")
+            await owner._listen_start()
+
+    def apis(self) -> list[SimplifiedAmcApi]:
+        return [api for owner in self._owners.values() for api in (owner, *owner._followers.values())]
+
+
+class AmcStateTable:
+    """Compact copy of the state bits of groups, areas, zones and outputs, for aggregate queries.
+    One row per entry, one column per state bit: a column is an int used as bitset (bit n = row n),
+    so the counts are bit counts and the per area (or group) rollups are counts of the column masked
+    with the rows of its zones (or areas)."""
+
+    __slots__ = ("rows", "ids", "columns", "_section_masks", "_area_masks", "_group_masks")
+
+    SECTIONS = (CentralDataSections.GROUPS, CentralDataSections.AREAS, CentralDataSections.ZONES, CentralDataSections.OUTPUTS)
+    BITS = ("bit_on", "bit_armed", "bit_opened", "bit_notReady", "anomaly", "bit_exludable", "bit_showHide", "redalert")
+
+    def __init__(self):
+        self.rows: dict[str, int] = {}  # filter_id -> row
+        self.ids: list[str] = []  # row -> filter_id
+        self.columns: dict[str, int] = dict.fromkeys(self.BITS, 0)
+        self._section_masks: dict[int, int] = {}
+        self._area_masks: dict[str, int] = {}  # area filter_id -> rows of its zones
+        self._group_masks: dict[str, int] = {}  # group filter_id -> rows of its areas
+
+    def rebuild(self, entries: list[AmcEntry], area_zones: dict[str, list[AmcEntry]], group_areas: dict[str, list[AmcEntry]]):
+        self.ids = [item.filter_id for item in entries]
+        self.rows = {filter_id: row for row, filter_id in enumerate(self.ids)}
+        self.columns = dict.fromkeys(self.BITS, 0)
+        self._section_masks = {}
+        for row, item in enumerate(entries):
+            self._section_masks[item.group] = self._section_masks.get(item.group, 0) | (1 << row)
+            states = item.states
+            for name in self.BITS:
+                if getattr(states, name, None):
+                    self.columns[name] |= 1 << row
+        self._area_masks = {area_id: self._mask(zones) for area_id, zones in area_zones.items()}
+        self._group_masks = {group_id: self._mask(areas) for group_id, areas in group_areas.items()}
+
+    def _mask(self, entries: list[AmcEntry]) -> int:
+        mask = 0
+        for item in entries:
+            row = self.rows.get(item.filter_id)
+            if row is not None:
+                mask |= 1 << row
+        return mask
+
+    def update(self, entry: AmcEntry) -> bool:
+        """Update the row of the entry, False if the entry has no row (rebuild needed)."""
+        row = self.rows.get(entry.filter_id)
+        if row is None:
+            return False
+        bit = 1 << row
+        states = entry.states
+        columns = self.columns
+        for name in self.BITS:
+            if getattr(states, name, None):
+                columns[name] |= bit
+            elif columns[name] & bit:
+                columns[name] ^= bit
+        return True
+
+    def _column(self, column: str, section: int | None) -> int:
+        value = self.columns[column]
+        return value if section is None else value & self._section_masks.get(section, 0)
+
+    def count(self, column: str, section: int | None = None) -> int:
+        """Entries (of section) with the bit set, e.g. count("bit_opened", CentralDataSections.ZONES)."""
+        return self._column(column, section).bit_count()
+
+    def filter_ids(self, column: str, section: int | None = None) -> list[str]:
+        """filter_id of the entries (of section) with the bit set."""
+        value = self._column(column, section)
+        ids = []
+        while value:
+            low = value & -value
+            ids.append(self.ids[low.bit_length() - 1])
+            value ^= low
+        return ids
+
+    def area_counts(self, column: str) -> dict[str, int]:
+        """Zones with the bit set, by area."""
+        value = self.columns[column]
+        return {area_id: (value & mask).bit_count() for area_id, mask in self._area_masks.items()}
+
+    def group_counts(self, column: str) -> dict[str, int]:
+        """Areas with the bit set, by group."""
+        value = self.columns[column]
+        return {group_id: (value & mask).bit_count() for group_id, mask in self._group_masks.items()}
+
+    def summary(self) -> dict:
+        zones = CentralDataSections.ZONES
+        return {
+            "rows": len(self.ids),
+            "zones": self._section_masks.get(zones, 0).bit_count(),
+            "zones_open": self.count("bit_opened", zones),
+            "zones_anomaly": self.count("anomaly", zones),
+            "zones_not_ready": self.count("bit_notReady", zones),
+            "areas_armed": self.count("bit_on", CentralDataSections.AREAS),
+            "groups_armed": self.count("bit_on", CentralDataSections.GROUPS),
+            "outputs_on": self.count("bit_on", CentralDataSections.OUTPUTS),
+            "areas_zones_open": {k: v for k, v in self.area_counts("bit_opened").items() if v},
+        }
+
+
+class AmcNotificationStore:
+    """Last notifications of the central, newest first, deduplicated by serverDate+name.
+    version is incremented only when a new notification arrives."""
+
+    def __init__(self, maxlen: int):
+        self.maxlen = max(1, maxlen)
+        self.version = 0
+        self._items: deque[AmcNotificationEntry] = deque()
+        self._keys: set[tuple[str, str]] = set()
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def latest(self) -> AmcNotificationEntry | None:
+        return self._items[0] if self._items else None
+
+    def sync(self, entries: list[AmcNotificationEntry]) -> bool:
+        """Add the entries (newest first) not yet in the store, return True if there are new notifications."""
+        new = []
+        new_keys = set()
+        for entry in entries:
+            key = _notification_key(entry)
+            if key in self._keys:
+                break
+            if key not in new_keys:
+                new_keys.add(key)
+                new.append(entry)
+            if len(new) >= self.maxlen:
+                break
+        if not new:
+            return False
+        if self._items and len(new) == len(entries):
+            # nothing in common with the received list: replaced
+            self._items.clear()
+            self._keys.clear()
+        for entry in reversed(new):
+            if len(self._items) >= self.maxlen:
+                self._keys.discard(_notification_key(self._items.pop()))
+            self._items.appendleft(entry)
+            self._keys.add(_notification_key(entry))
+        self.version += 1
+        return True
+
+
 class AmcStatesParser:
-    def __init__(self, states: dict[str, AmcCentralResponse]):
+    """Lookups over a states snapshot.
+    Sections and the Id -> entry index are built once per parser, reuse the same parser
+    while the states version doesn't change."""
+
+    def __init__(self, states: dict[str, AmcCentralResponse], version: int = None):
         self._raw_states = states
+        self.version = version
+        self._sections: dict[tuple[str, int], AmcData | AmcNotification] = {}
+        self._entries: dict[tuple[str, int], dict[int, AmcEntry]] = {}
 
     def raw_states(self) -> dict[str, AmcCentralResponse]:
         return self._raw_states
 
     def _get_section(self, central_id, section_index) -> AmcData | AmcNotification:
-        central = self._raw_states[central_id]
-        try:
-            section = next(x for x in central.data if x.index == section_index)
-            return section
-        except StopIteration:
-            return AmcData(index=0, list=[], name="_none")
+        key = (central_id, section_index)
+        section = self._sections.get(key)
+        if section is None:
+            central = self._raw_states[central_id]
+            try:
+                section = next(x for x in central.data if x.index == section_index)
+            except StopIteration:
+                section = AmcData(index=0, list=[], name="_none")
+            self._sections[key] = section
+        return section
+
+    def _get_entry(self, central_id, section_index, entry_id: int, id_attr: str = "Id") -> AmcEntry:
+        key = (central_id, section_index)
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = {getattr(x, id_attr): x for x in self._get_section(central_id, section_index).list}
+            self._entries[key] = entries
+        return entries[entry_id]
 
     def groups(self, central_id: str) -> AmcData:
         return self._get_section(central_id, CentralDataSections.GROUPS)
 
     def group(self, central_id: str, entry_id: int) -> AmcEntry:
-        return next(x for x in self.groups(central_id).list if x.Id == entry_id)
+        return self._get_entry(central_id, CentralDataSections.GROUPS, entry_id)
 
     def areas(self, central_id: str) -> AmcData:
         return self._get_section(central_id, CentralDataSections.AREAS)
 
     def area(self, central_id: str, entry_id: int) -> AmcEntry:
-        return next(x for x in self.areas(central_id).list if x.Id == entry_id)
+        return self._get_entry(central_id, CentralDataSections.AREAS, entry_id)
 
     def zones(self, central_id: str) -> AmcData:
         return self._get_section(central_id, CentralDataSections.ZONES)
 
     def zone(self, central_id: str, entry_id: int) -> AmcEntry:
-        return next(x for x in self.zones(central_id).list if x.Id == entry_id)
+        return self._get_entry(central_id, CentralDataSections.ZONES, entry_id)
 
     def outputs(self, central_id: str) -> AmcData:
         return self._get_section(central_id, CentralDataSections.OUTPUTS)
 
     def output(self, central_id: str, entry_id: int) -> AmcEntry:
-        return next(x for x in self.outputs(central_id).list if x.Id == entry_id)
+        return self._get_entry(central_id, CentralDataSections.OUTPUTS, entry_id)
 
     def system_statuses(self, central_id: str) -> AmcData:
         return self._get_section(central_id, CentralDataSections.SYSTEM_STATUS)
 
     def system_status(self, central_id: str, entry_index: int) -> AmcEntry:
-        return next(
-            x for x in self.system_statuses(central_id).list if x.index == entry_index
-        )
+        return self._get_entry(central_id, CentralDataSections.SYSTEM_STATUS, entry_index, "index")
 
     def notifications(self, central_id: str) -> list[AmcNotificationEntry]:
         return self._get_section(central_id, CentralDataSections.NOTIFICATIONS).list
@@ -962,6 +1956,50 @@ class AmcStatesParser:
         return None
 
 
+STATES_KEY_CONNECTION = "connection"
+
+
+def states_key(section: int, index: int = None) -> str:
+    """Key used in the changed keys: 'section' or 'section.index' (same as AmcEntry.filter_id)."""
+    if index is None:
+        return str(section)
+    return f"{section}.{index}"
+
+
+def _patch_changed_keys(path: str) -> set[str] | None:
+    """Changed keys for a patch path, None if the patch could change all the states."""
+    # /centrals/<central_id>/data/<section>/list/<index>/...
+    parts = path.strip("/").split("/")
+    if len(parts) < 4 or parts[2] != "data" or not parts[3].isdigit():
+        return None
+    section = int(parts[3])
+    if len(parts) > 6 and parts[4] == "list" and parts[5].isdigit():
+        return {states_key(section), states_key(section, int(parts[5]))}
+    if section in (CentralDataSections.GROUPS, CentralDataSections.AREAS, CentralDataSections.ZONES,
+                   CentralDataSections.OUTPUTS, CentralDataSections.SYSTEM_STATUS):
+        #entries added/removed/replaced, the last list key is a position
+        return None
+    return {states_key(section)}
+
+
+def _traced(tracer: AmcTracer, stage: str, fn, *args, **kwargs):
+    token = tracer.start(stage)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        tracer.end(stage, token)
+
+
+def _patch_central_id(path: str) -> str | None:
+    """Central of a patch path: /centrals/<central_id>/..."""
+    parts = path.strip("/").split("/", 2)
+    return parts[1] if len(parts) > 1 and parts[0] == "centrals" else None
+
+
+def _is_patch_message(message: WSMessage | None) -> bool:
+    return message is not None and f'"{AmcCommands.APPLY_PATCH}"' in message.data
+
+
 def safe_json_loads(value: str):
     """Try to convert the JSON string to dict,
     otherwise return the original string."""
@@ -972,16 +2010,76 @@ def safe_json_loads(value: str):
     except (ValueError, TypeError):
         return value
 
-def _find_pos_by_item_index(lst, index_value) -> int | None:
-    """Search in lst for the element with field 'index' == index_value and return the position, otherwise None."""
-    for i, item in enumerate(lst):
-        if isinstance(item, dict):
-            # confronto flessibile su stringa/int
-            if item.get("index") is not None and str(item.get("index")) == str(index_value):
-                return i
+def _notification_key(entry: AmcNotificationEntry) -> tuple[str, str]:
+    return (entry.serverDate, entry.name)
+
+
+def _is_notifications_path(path: tuple) -> bool:
+    """.../list/<n>/notifications/<pos> of an entry or /data/5/list/<pos>"""
+    return (len(path) > 1 and path[-2] == "notifications") or path[-4:-1] == ("data", CentralDataSections.NOTIFICATIONS, "list")
+
+
+@lru_cache(maxsize=4096)
+def _split_patch_path(path: str) -> tuple:
+    """'/centrals/X/data/2/list/19/states' -> ('centrals', 'X', 'data', 2, 'list', 19, 'states')
+    Keys with leading zeros (e.g. PINs) are kept as strings."""
+    return tuple(
+        int(key) if key.isdigit() and (key[0] != "0" or key == "0") else key
+        for key in path.strip("/").split("/")
+    )
+
+
+def _item_index(item) -> int | None:
+    """The "index" of a list item as int (sometimes is received as string)."""
+    index = item.get("index") if isinstance(item, dict) else getattr(item, "index", None)
+    if isinstance(index, int):
+        return index
+    if isinstance(index, str) and index.isdigit():
+        return int(index)
     return None
 
 
+def _list_positions(lst: list) -> dict[int, int]:
+    positions = {}
+    for pos, item in enumerate(lst):
+        index = _item_index(item)
+        if index is not None:
+            positions.setdefault(index, pos)
+    return positions
+
+
+_MODEL_NOT_MAPPED = object()
+
+
+def _unwrap_optional(tp):
+    """Optional[X] -> X, other annotations are returned as is."""
+    if get_origin(tp) in (Union, types.UnionType):
+        args = [a for a in get_args(tp) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return tp
+
+
+@lru_cache(maxsize=None)
+def _type_adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def _model_get(target, key):
+    if isinstance(target, BaseModel):
+        return getattr(target, key, None)
+    if isinstance(target, list):
+        return target[key] if -len(target) <= key < len(target) else None
+    return target.get(key)
+
+
+def _model_set(target, key, value):
+    if isinstance(target, BaseModel):
+        setattr(target, key, value)
+    else:
+        target[key] = value
+
+
 def loop_time_to_datetime(loop_time: float) -> datetime:
     if not loop_time:
         return loop_time
@@ -0,0 +1,157 @@
+"""Capture of the websocket frames to a rotating JSONL file, and replay of the captures."""
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from collections import defaultdict
+
+from aiohttp import WSMessage, WSMsgType
+
+_LOGGER = logging.getLogger(__name__)
+
+# values replaced in the captured frames
+SENSITIVE_KEYS = {"email", "password", "centralUsername", "centralPassword", "userPIN", "token", "pin"}
+REDACTED = "***"
+
+
+def redact_frame(data: str, secrets: list[str] = None) -> str:
+    """Return the frame with credentials, tokens and PINs (also the keys of the users dict, in the states
+    and in the paths and values of the patches) replaced."""
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        frame = data
+    else:
+        frame = json.dumps(_redact(frame), separators=(",", ":"))
+    for secret in secrets or []:
+        if secret:
+            frame = frame.replace(secret, REDACTED)
+    return frame
+
+
+def _redact(value, key: str = None):
+    if isinstance(value, dict):
+        if key == "users":
+            # users are indexed by PIN
+            return {f"{REDACTED}{n}": _redact(user) for n, user in enumerate(value.values())}
+        return {k: REDACTED if k in SENSITIVE_KEYS and v else _redact(v, k) for k, v in value.items()}
+    if key == "patch" and isinstance(value, list):
+        return [_redact_patch_op(op) for op in value]
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def _redact_patch_op(op):
+    """A json patch operation with the PINs in its paths (the segment after users) and value redacted."""
+    if not isinstance(op, dict):
+        return _redact(op)
+    res = {}
+    for k, v in op.items():
+        if k in ("path", "from") and isinstance(v, str):
+            parts = v.split("/")
+            res[k] = "/".join(REDACTED if n and parts[n - 1] == "users" else part for n, part in enumerate(parts))
+        elif k == "value":
+            # the users dict itself: its keys are PINs
+            path = op.get("path")
+            res[k] = _redact(v, "users" if isinstance(path, str) and path.rsplit("/", 1)[-1] == "users" else None)
+        else:
+            res[k] = _redact(v, k)
+    return res
+
+
+class FrameCapture:
+    """Write the frames as JSONL records {"ts", "direction", "data"}.
+    The file is written by a thread (no blocking I/O in the event loop), rotated at max_bytes keeping backup_count files."""
+
+    def __init__(self, path: str, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3, secrets: list[str] = None):
+        self.path = path
+        self._secrets = [s for s in (secrets or []) if s]
+        self._handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, self._handler)
+        self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self.frames = 0
+        self._listener.start()
+
+    def write(self, direction: str, data: str):
+        record = {"ts": time.time(), "direction": direction, "data": redact_frame(data, self._secrets)}
+        self._logger.info(json.dumps(record, separators=(",", ":")))
+        self.frames += 1
+
+    def close(self):
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._listener.stop()
+        self._handler.close()
+
+
+def read_capture(paths: list[str]) -> list[dict]:
+    """Records of the capture files (pass the rotated files from the oldest), sorted by time."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def capture_central_id(records: list[dict]) -> str | None:
+    """Central id of the first getStates received."""
+    for record in records:
+        if record.get("direction") == "in" and '"centrals"' in record["data"]:
+            centrals = json.loads(record["data"]).get("centrals")
+            if isinstance(centrals, dict) and centrals:
+                return next(iter(centrals))
+    return None
+
+
+async def replay_capture(api, records: list[dict], speed: float = 0) -> dict:
+    """Feed the received frames to api._process_message.
+    speed: 1 at recorded speed, 2 double speed..., 0 maximum speed.
+    Return the number of frames and the processing time per command."""
+    loop = asyncio.get_running_loop()
+    times: dict[str, list[float]] = defaultdict(list)
+    first_ts = None
+    start = loop.time()
+    for record in records:
+        if record.get("direction") != "in":
+            continue
+        if speed > 0:
+            first_ts = first_ts or record["ts"]
+            delay = start + (record["ts"] - first_ts) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        data = record["data"]
+        begin = time.perf_counter()
+        await api._process_message(WSMessage(WSMsgType.TEXT, data, None))
+        times[_frame_command(data)].append(time.perf_counter() - begin)
+        # let the scheduled flushes run
+        await asyncio.sleep(0)
+    await api._flush()
+    return {
+        "frames": sum(len(t) for t in times.values()),
+        "elapsed": loop.time() - start,
+        "commands": {
+            command: {"count": len(t), "total_ms": round(sum(t) * 1000, 3), "avg_us": round(sum(t) / len(t) * 1e6, 2)}
+            for command, t in times.items()
+        },
+    }
+
+
+def _frame_command(data: str) -> str:
+    try:
+        return json.loads(data).get("command") or "?"
+    except (ValueError, AttributeError):
+        return "invalid"
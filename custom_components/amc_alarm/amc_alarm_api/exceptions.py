@@ -15,3 +15,6 @@ class AmcCentralNotFoundException(AmcException):
 
 class AmcCentralStatusErrorException(AmcException):
     pass
+
+class AmcPatchModelException(AmcException):
+    pass
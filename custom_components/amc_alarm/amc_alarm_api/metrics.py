@@ -0,0 +1,100 @@
+"""Rolling metrics of the websocket connection and of the commands, with fixed memory."""
+from collections import deque
+
+
+def percentiles(values, percents=(50, 95, 99)) -> dict[str, float]:
+    """Nearest-rank percentiles of values, as {"p50": .., "max": ..}."""
+    values = sorted(values)
+    if not values:
+        return {}
+    res = {f"p{p}": values[min(len(values) - 1, max(0, -(-len(values) * p // 100) - 1))] for p in percents}
+    res["max"] = values[-1]
+    return res
+
+
+class AmcRate:
+    """Count and bytes of the events, per second over the last WINDOW seconds (one bucket per second)."""
+    WINDOW = 60
+
+    __slots__ = ("_buckets", "count", "bytes")
+
+    def __init__(self):
+        # [second, count, bytes]
+        self._buckets: deque[list[int]] = deque(maxlen=self.WINDOW)
+        self.count = 0
+        self.bytes = 0
+
+    def add(self, now: float, size: int):
+        second = int(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            bucket = self._buckets[-1]
+            bucket[1] += 1
+            bucket[2] += size
+        else:
+            self._buckets.append([second, 1, size])
+        self.count += 1
+        self.bytes += size
+
+    def stats(self, now: float) -> dict:
+        start = int(now) - self.WINDOW
+        count = size = 0
+        for second, bucket_count, bucket_bytes in self._buckets:
+            if second > start:
+                count += bucket_count
+                size += bucket_bytes
+        return {
+            "total": self.count,
+            "bytes_total": self.bytes,
+            "per_second": round(count / self.WINDOW, 2),
+            "bytes_per_second": round(size / self.WINDOW, 1),
+        }
+
+
+class AmcMetrics:
+    """Round trip time by command, latency from the patch received to the entities updated,
+    traffic and reconnections. Only the last SAMPLES times are kept for the percentiles."""
+    SAMPLES = 200
+
+    def __init__(self):
+        self.rtt: dict[str, deque[float]] = {}
+        self.update_latencies: deque[float] = deque(maxlen=self.SAMPLES)
+        self.received = AmcRate()
+        self.sent = AmcRate()
+        self.connects = 0
+        # loop time of the first patch not yet shown by the entities
+        self._patch_time: float | None = None
+
+    def add_rtt(self, command: str, seconds: float):
+        samples = self.rtt.get(command)
+        if samples is None:
+            samples = self.rtt[command] = deque(maxlen=self.SAMPLES)
+        samples.append(seconds)
+
+    def patch_received(self, now: float):
+        if self._patch_time is None:
+            self._patch_time = now
+
+    def entities_updated(self, now: float):
+        if self._patch_time is not None:
+            self.update_latencies.append(now - self._patch_time)
+            self._patch_time = None
+
+    @property
+    def reconnects(self) -> int:
+        return max(0, self.connects - 1)
+
+    def command_stats(self) -> dict:
+        """Percentiles (seconds) of the round trip time by command and of the patch to entities latency."""
+        return {
+            "rtt": {command: {"count": len(samples), **percentiles(samples)} for command, samples in self.rtt.items()},
+            "update_latency": {"count": len(self.update_latencies), **percentiles(self.update_latencies)},
+        }
+
+    def connection_stats(self, now: float) -> dict:
+        """Messages and bytes received/sent, connections to the websocket."""
+        return {
+            "received": self.received.stats(now),
+            "sent": self.sent.stats(now),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,107 @@
+"""Hooks around the stages of the message handling, and a collector of their times."""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from .metrics import percentiles
+
+# stages traced by SimplifiedAmcApi
+TRACE_MESSAGE = "message" # a received frame, from the parse to the states patched
+TRACE_PARSE = "parse" # json of the frame
+TRACE_VALIDATE = "validate" # typed models of the frame
+TRACE_JSON_PATCH = "json_patch" # one operation of an applyPatch
+TRACE_FLUSH = "flush" # the coalesced updates, from the calculated states to the callback
+TRACE_CALCULATED_STATES = "calculated_states"
+TRACE_CALLBACK = "callback" # the coordinator callback (entities updated)
+
+# times of the nested stages of the message or flush being traced, by task
+_TRACE_ROOT: ContextVar[dict | None] = ContextVar("amc_trace_root", default=None)
+
+
+class AmcTracer:
+    """Hooks called by the api around the traced stages, see SimplifiedAmcApi.start_trace.
+    start returns a token passed back to end, the stages of the same task are nested."""
+
+    def start(self, stage: str):
+        return None
+
+    def end(self, stage: str, token) -> None:
+        pass
+
+
+class AmcTraceCollector(AmcTracer):
+    """Time spent in each stage, and its split in the nested stages for the last messages and flushes.
+    Monitors also the event loop lag: a late timer means the loop is blocked (by anything running in it)."""
+    ROOT_STAGES = (TRACE_MESSAGE, TRACE_FLUSH)
+    SAMPLES = 200
+    RECENT = 20
+    LOOP_MONITOR_INTERVAL = 0.5 # seconds
+
+    def __init__(self):
+        self._samples: dict[str, deque[float]] = {}
+        self._totals: dict[str, list] = {} # stage -> [count, seconds]
+        self.recent: deque[dict] = deque(maxlen=self.RECENT)
+        self.loop_lags: deque[float] = deque(maxlen=self.SAMPLES)
+        self._loop_handle: asyncio.TimerHandle | None = None
+
+    def start(self, stage: str):
+        if stage in self.ROOT_STAGES:
+            return time.perf_counter(), _TRACE_ROOT.set({})
+        return time.perf_counter()
+
+    def end(self, stage: str, token) -> None:
+        now = time.perf_counter()
+        if stage in self.ROOT_STAGES:
+            start, root_token = token
+            seconds = now - start
+            stages = _TRACE_ROOT.get()
+            _TRACE_ROOT.reset(root_token)
+            self.recent.append({
+                "stage": stage,
+                "time": round(time.time(), 3),
+                "seconds": seconds,
+                "stages": stages,
+            })
+        else:
+            seconds = now - token
+            root = _TRACE_ROOT.get()
+            if root is not None:
+                root[stage] = root.get(stage, 0) + seconds
+        self._add(stage, seconds)
+
+    def _add(self, stage: str, seconds: float):
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.SAMPLES)
+            self._totals[stage] = [0, 0.0]
+        samples.append(seconds)
+        totals = self._totals[stage]
+        totals[0] += 1
+        totals[1] += seconds
+
+    def start_loop_monitor(self, loop: asyncio.AbstractEventLoop):
+        self.stop_loop_monitor()
+        self._loop_tick(loop, None)
+
+    def stop_loop_monitor(self):
+        if self._loop_handle:
+            self._loop_handle.cancel()
+            self._loop_handle = None
+
+    def _loop_tick(self, loop: asyncio.AbstractEventLoop, expected: float | None):
+        now = loop.time()
+        if expected is not None:
+            self.loop_lags.append(max(0.0, now - expected))
+        self._loop_handle = loop.call_at(now + self.LOOP_MONITOR_INTERVAL, self._loop_tick, loop, now + self.LOOP_MONITOR_INTERVAL)
+
+    def report(self) -> dict:
+        """Seconds by stage (count, total and percentiles of the last ones), last messages and flushes, loop lag."""
+        return {
+            "stages": {
+                stage: {"count": self._totals[stage][0], "total": self._totals[stage][1], **percentiles(samples)}
+                for stage, samples in self._samples.items()
+            },
+            "recent": list(self.recent),
+            "loop_lag": {"count": len(self.loop_lags), **percentiles(self.loop_lags)},
+        }
@@ -241,6 +241,22 @@ class AmcConfigFlow(ConfigFlow, domain=DOMAIN):
             vol.Required(CONF_TITLE, description=get_vol_descr(config, CONF_TITLE)): str,
 
             vol.Required(CONF_SCAN_INTERVAL, description=get_vol_descr(config, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)): int,
+            vol.Optional(CONF_ADAPTIVE_POLLING, description=get_vol_descr(config, CONF_ADAPTIVE_POLLING, True)): bool,
+            vol.Optional(CONF_FLUSH_DELAY, description=get_vol_descr(config, CONF_FLUSH_DELAY, DEFAULT_FLUSH_DELAY_MS)): vol.All(int, vol.Range(min=0, max=1000)),
+            vol.Optional(CONF_NOTIFICATIONS_MAX, description=get_vol_descr(config, CONF_NOTIFICATIONS_MAX, DEFAULT_NOTIFICATIONS_MAX)): vol.All(int, vol.Range(min=1, max=1000)),
+            vol.Optional(CONF_ATTRIBUTES_PROFILE, description=get_vol_descr(config, CONF_ATTRIBUTES_PROFILE, DEFAULT_ATTRIBUTES_PROFILE)): selector.SelectSelector(
+                selector.SelectSelectorConfig(
+                    options=[
+                        {"value": ATTRIBUTES_PROFILE_FULL, "label": "Full (all fields, notifications history)"},
+                        {"value": ATTRIBUTES_PROFILE_COMPACT, "label": "Compact (state bits, last notification)"},
+                        {"value": ATTRIBUTES_PROFILE_NONE, "label": "None"},
+                    ],
+                    mode=selector.SelectSelectorMode.DROPDOWN,
+                    multiple=False,
+                )
+            ),
+            vol.Optional(CONF_CAPTURE_FRAMES, description=get_vol_descr(config, CONF_CAPTURE_FRAMES, False)): bool,
+            vol.Optional(CONF_TRACE_STAGES, description=get_vol_descr(config, CONF_TRACE_STAGES, False)): bool,
         }
         
         api = self.api
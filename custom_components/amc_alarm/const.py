@@ -24,6 +24,12 @@ CONF_USER_PIN = "user_pin"
 CONF_USER_INDEX = "user_index"
 
 CONF_FLOW_VERSION = "config_version"
+CONF_FLUSH_DELAY = "flush_delay_ms"
+CONF_CAPTURE_FRAMES = "capture_frames"
+CONF_TRACE_STAGES = "trace_stages"
+CONF_NOTIFICATIONS_MAX = "notifications_max"
+CONF_ATTRIBUTES_PROFILE = "attributes_profile"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
 CONF_FLOW_LAST_VERSION = 1
 
 
@@ -57,6 +63,35 @@ CONF_GACP_CUSTOM_BYPASS_IDS = "alarm_general_custom_bypass_ids"
 
 
 DEFAULT_SCAN_INTERVAL = 30
+DEFAULT_FLUSH_DELAY_MS = 30
+DEFAULT_NOTIFICATIONS_MAX = 50
+
+# ADAPTIVE POLLING: the periodic getStates is skipped while the patches are received and applied
+ADAPTIVE_POLL_MAX_INTERVAL = 600 # seconds, a full getStates at least every 10 minutes
+ADAPTIVE_POLL_QUIET_INTERVALS = 2 # scan intervals without patches: the stream is quiet, polling every scan interval
+
+# STATE ATTRIBUTES PROFILES (written by the recorder at every state change)
+ATTRIBUTES_PROFILE_FULL = "full" # all the entry fields, notifications history included
+ATTRIBUTES_PROFILE_COMPACT = "compact" # identifiers, arm state and state bits, last notification only
+ATTRIBUTES_PROFILE_NONE = "none"
+DEFAULT_ATTRIBUTES_PROFILE = ATTRIBUTES_PROFILE_FULL
+
+# METRICS: sensors polling interval (seconds) and service returning all the metrics
+METRICS_SCAN_INTERVAL = 60
+SERVICE_GET_METRICS = "get_metrics"
+
+# key in hass.data[DOMAIN] of the AmcConnectionManager: one websocket for the centrals of the same account
+CONNECTION_MANAGER = "connection_manager"
+
+# STATES SNAPSHOT STORAGE
+STORAGE_VERSION = 1
+STORAGE_KEY = DOMAIN + ".states_"
+SNAPSHOT_SAVE_DELAY = 10 # seconds, coalesce the writes of the states snapshot
+
+# FRAMES CAPTURE (in the config directory)
+CAPTURE_FILE = DOMAIN + "_capture_{}.jsonl"
+CAPTURE_MAX_BYTES = 5 * 1024 * 1024
+CAPTURE_BACKUP_COUNT = 3
 
 # DATA COORDINATOR ATTRIBUTES
 LAST_UPDATED = "last_updated"
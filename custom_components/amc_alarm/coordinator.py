@@ -1,19 +1,22 @@
 """AMC alarm integration."""
 import asyncio
 import logging
+import time
+from collections import deque
 from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_EMAIL, CONF_PASSWORD, SERVICE_RELOAD, CONF_SCAN_INTERVAL, CONF_TIMEOUT
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady, ConfigEntryError
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.helpers.typing import ConfigType
-from .amc_alarm_api import SimplifiedAmcApi
+from .amc_alarm_api import AmcConnectionManager, SimplifiedAmcApi
 from .amc_alarm_api.api import AmcStatesParser, ConnectionState
 from .amc_alarm_api.exceptions import * # AuthenticationFailed, AmcException
-from .amc_alarm_api.amc_proto import AmcCommands
+from .amc_alarm_api.amc_proto import AmcCommands, CentralDataSections
 from .const import *
 
 _LOGGER = logging.getLogger(__name__)
@@ -31,6 +34,10 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
     _last_devices_hash = ""
     _callback_disabled = False
     _async_request_refresh_from_callback = False
+    _data_parsed: AmcStatesParser | None = None
+    _listeners_update_success = True
+    _listeners_available: bool | None = None
+    _snapshot_loaded = False
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
         """Initialize."""
@@ -43,6 +50,10 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
         #_LOGGER.debug("AMC settings: %s" % self.amcconfig)
 
         self._callback_disabled = True
+        self._setup_time = time.monotonic()
+        self.startup_stats = {}
+        # last valid states, for create the entities at startup without waiting the central
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY + entry.entry_id)
         #self.devices_for_platform = {}
         if entry:
             self.entity_unique_id_prefix = entry.unique_id or ""
@@ -53,6 +64,11 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
         if uptade_interval < 1:
             uptade_interval = DEFAULT_SCAN_INTERVAL
         super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=timedelta(seconds=uptade_interval))
+        self._scan_interval = uptade_interval
+        self.adaptive_polling = self.get_config(CONF_ADAPTIVE_POLLING, True, bool)
+        self._polls = 0
+        self._poll_skips = 0
+        self._poll_times: deque[float] = deque(maxlen=20)
 
         userinfo = self.amcconfig
         self.api = SimplifiedAmcApi(
@@ -63,6 +79,17 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
             userinfo[CONF_CENTRAL_PASSWORD],
             self.api_new_data_received_callback,
         )
+        hass.data.setdefault(DOMAIN, {}).setdefault(CONNECTION_MANAGER, AmcConnectionManager()).attach(self.api)
+        flush_delay_ms = self.get_config(CONF_FLUSH_DELAY, DEFAULT_FLUSH_DELAY_MS, int)
+        self.api.flush_delay = max(0, flush_delay_ms) / 1000
+        self.attributes_profile = self.get_config(CONF_ATTRIBUTES_PROFILE, DEFAULT_ATTRIBUTES_PROFILE)
+        self.api.set_notifications_max(self.get_config(CONF_NOTIFICATIONS_MAX, DEFAULT_NOTIFICATIONS_MAX, int))
+        if self.get_config(CONF_CAPTURE_FRAMES, False, bool):
+            self.api.start_capture(
+                hass.config.path(CAPTURE_FILE.format(entry.entry_id)), CAPTURE_MAX_BYTES, CAPTURE_BACKUP_COUNT
+            )
+        if self.get_config(CONF_TRACE_STAGES, False, bool):
+            self.api.start_trace()
         #self.api.set_task_factory(
         #    create_task=hass.async_create_task,
         #    create_future=hass.loop.create_future
@@ -70,11 +97,63 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
         
     @property
     def data_parsed(self) -> AmcStatesParser:
-        return AmcStatesParser(self.data)
+        #reuse the parser (and its indexes) until data or states version change
+        parsed = self._data_parsed
+        version = self.api.states_version
+        if parsed is None or parsed.raw_states() is not self.data or parsed.version != version:
+            parsed = self._data_parsed = AmcStatesParser(self.data, version)
+        return parsed
+
+    @property
+    def states_stale(self) -> bool:
+        """True while the states are the ones loaded from the snapshot, waiting the live getStates"""
+        return self._snapshot_loaded and not self.api._raw_states_central_valid
 
     @property
     def device_available(self):
-        return self.api._device_available
+        api = self.api
+        if self.states_stale:
+            # available with the snapshot states until the connection fails
+            return api._failed_attempts == 0 and api._ws_state not in (ConnectionState.STOPPED, ConnectionState.CENTRAL_KO)
+        return api._device_available
+
+    async def async_load_snapshot(self) -> bool:
+        """Load the states saved by a previous run, return True if the entities can be created from them"""
+        try:
+            stored = await self._store.async_load()
+            if not stored or not stored.get("states"):
+                return False
+            if not await self.api.load_states_snapshot(stored["states"], stored.get("pin_required")):
+                _LOGGER.debug("States snapshot ignored, central %s not found", self.api._central_id)
+                return False
+        except Exception as error:
+            _LOGGER.warning("Error loading states snapshot: %s", error)
+            return False
+        self._snapshot_loaded = True
+        self.async_set_updated_data(self.api.raw_states())
+        return True
+
+    @callback
+    def _async_save_snapshot(self) -> None:
+        api = self.api
+        if not api._raw_states_central_valid:
+            return
+        if "live_states_seconds" not in self.startup_stats:
+            self.startup_stats["live_states_seconds"] = round(time.monotonic() - self._setup_time, 3)
+            _LOGGER.info("Live states received in %.3f s (snapshot loaded: %s)", self.startup_stats["live_states_seconds"], self._snapshot_loaded)
+        if api.raw_states():
+            self._store.async_delay_save(self._snapshot_data, SNAPSHOT_SAVE_DELAY)
+
+    def _snapshot_data(self) -> dict:
+        # serialized when the store writes, from the typed states.
+        # The users are indexed by PIN: not written to disk, they come with the live getStates.
+        # pin_required is saved instead, with amcProtoVer 1 it depends on the users
+        states = self.api.raw_states_json_model
+        if states is None:
+            return {}
+        for central in states["centrals"].values():
+            central["data"] = [x for x in central.get("data") or [] if x.get("index") != CentralDataSections.USERS]
+        return {"states": states, "pin_required": self.api.pin_required}
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -87,7 +166,7 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
                     manufacturer="AMC Elettronica",
                     name=device_title or central_id
                 )
-            states = AmcStatesParser(self.data)
+            states = self.data_parsed
             # Creo DeviceInfo solo la prima volta
             self._device_info = DeviceInfo(
                 identifiers={(DOMAIN, central_id)},
@@ -115,6 +194,28 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
                 return default
         return value
 
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update only the listeners with a context (set of states keys) matching the keys changed in the api.
+        Listeners without context are updated only when all the states could be changed, or the availability
+        of the device is changed."""
+        changed = self.api.pop_changed_keys()
+        if self._listeners_update_success != self.last_update_success:
+            self._listeners_update_success = self.last_update_success
+            changed = None
+        # the availability of all the entities: with the snapshot states it follows the connection
+        # state, changed with the connection key only
+        available = self.device_available
+        if self._listeners_available != available:
+            self._listeners_available = available
+            changed = None
+        if changed is None:
+            super().async_update_listeners()
+            return
+        for update_callback, context in list(self._listeners.values()):
+            if context and not changed.isdisjoint(context):
+                update_callback()
+
     async def api_new_data_received_callback(self):
         if self._callback_disabled:
             return
@@ -122,6 +223,7 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
         #_LOGGER.debug("api_new_data_received_callback: eseguo coordinator.async_request_refresh dopo update dei valori")
         states = self.api.raw_states() or {}
         self.async_set_updated_data(states)
+        self._async_save_snapshot()
         self._async_request_refresh_from_callback = True
         await self.async_request_refresh()
         #self._async_request_refresh_from_callback = False
@@ -143,7 +245,7 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
             elif self._async_request_refresh_from_callback:
                 self._async_request_refresh_from_callback = False
                 states = states or {}
-            else:
+            elif self._periodic_states_required():
                 api._msg_quee_get_states = True
                 await self.api._send_msg_quee()
             if api._ws_state == ConnectionState.STOPPED and api._ws_state_stop_exeception:
@@ -162,8 +264,46 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
 
         if not states:
             raise UpdateFailed()
+        self._async_save_snapshot()
         return states
 
+    def _periodic_states_required(self) -> bool:
+        """Adaptive polling: the periodic getStates is skipped while the patches are received and applied,
+        and sent every scan interval when the patches stream is quiet or a patch failed after the last states."""
+        api = self.api
+        now = self.hass.loop.time()
+        required = (
+            not self.adaptive_polling
+            or api._ws_state != ConnectionState.CENTRAL_OK
+            or api.last_states_time is None
+            or now - api.last_states_time >= ADAPTIVE_POLL_MAX_INTERVAL
+            or (api.last_patch_error_time is not None and api.last_patch_error_time >= api.last_states_time)
+            or api.last_patch_time is None
+            or now - api.last_patch_time > self._scan_interval * ADAPTIVE_POLL_QUIET_INTERVALS
+        )
+        if required:
+            self._polls += 1
+            self._poll_times.append(now)
+        else:
+            self._poll_skips += 1
+        return required
+
+    def poll_stats(self) -> dict:
+        """Periodic getStates sent and skipped, effective interval (seconds) of the last ones sent."""
+        api = self.api
+        now = self.hass.loop.time()
+        times = self._poll_times
+        return {
+            "adaptive": self.adaptive_polling,
+            "scan_interval": self._scan_interval,
+            "max_interval": ADAPTIVE_POLL_MAX_INTERVAL,
+            "polls": self._polls,
+            "skips": self._poll_skips,
+            "effective_interval": round((times[-1] - times[0]) / (len(times) - 1), 1) if len(times) > 1 else None,
+            "last_states_age": round(now - api.last_states_time, 1) if api.last_states_time is not None else None,
+            "last_patch_age": round(now - api.last_patch_time, 1) if api.last_patch_time is not None else None,
+        }
+
     def get_default_pin(self) -> str:
         if not self.api.pin_required:
             return None
@@ -171,6 +311,9 @@ class AmcDataUpdateCoordinator(DataUpdateCoordinator):
         user_idx = int(user_idx_str) if user_idx_str and user_idx_str.isdigit() else -1
         if user_idx > -1:
             userPIN = self.data_parsed.user_pin_by_index(self.api._central_id, user_idx)
+            if not userPIN and self.states_stale:
+                # the snapshot states have no users
+                raise AmcException("Default PIN not available until the states are received from the central.")
             if not userPIN:
                 raise AmcException("Default PIN not found. try riconfigure component. UserIndex: '%s'" % user_idx_str)
             return userPIN
@@ -24,6 +24,15 @@ async def async_get_config_entry_diagnostics(
     data.update({        
         "raw_states": api.raw_states_json_model,
         "messages": api._messages,
+        "flush_stats": api.flush_stats(),
+        "receive_queue_stats": api.receive_queue_stats(),
+        "poll_stats": coordinator.poll_stats(),
+        "optimistic_stats": api.optimistic_stats(),
+        "metrics": api.metrics_stats(),
+        "trace": api.trace_report(),
+        "state_summary": api.state_table.summary(),
+        "states_stale": coordinator.states_stale,
+        "startup_stats": coordinator.startup_stats,
     })
     sensitive_values = { CONF_CENTRAL_ID, CONF_CENTRAL_USERNAME, CONF_CENTRAL_PASSWORD, CONF_EMAIL, CONF_PASSWORD };
     json_str = json.dumps(serialize(data), default=str)
@@ -6,10 +6,21 @@ from homeassistant.core import callback
 from homeassistant.util import slugify
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from .coordinator import AmcDataUpdateCoordinator
-from .amc_alarm_api.amc_proto import AmcCentralResponse, AmcEntry
-from .amc_alarm_api.api import AmcStatesParser
-from .const import DOMAIN, CONF_TITLE
+from .amc_alarm_api.amc_proto import AmcCentralResponse, AmcEntry, CentralDataSections
+from .amc_alarm_api.api import AmcStatesParser, states_key
+from .const import DOMAIN, CONF_TITLE, ATTRIBUTES_PROFILE_COMPACT, ATTRIBUTES_PROFILE_NONE
 
+# entry fields kept by the compact attributes profile
+COMPACT_ATTRIBUTES = {"index", "Id", "group", "filter_id", "arm_state", "states"}
+
+
+def entry_attributes(entry, profile: str) -> Optional[dict[str, Any]]:
+    """State attributes of an entry for the attributes profile (full, compact, none)."""
+    if profile == ATTRIBUTES_PROFILE_NONE:
+        return None
+    if profile == ATTRIBUTES_PROFILE_COMPACT:
+        return entry.dict(include=COMPACT_ATTRIBUTES, exclude_none=True)
+    return entry.dict()
 
 
 class AmcBaseEntity(CoordinatorEntity):
@@ -21,13 +32,22 @@ class AmcBaseEntity(CoordinatorEntity):
         coordinator: AmcDataUpdateCoordinator,
         amc_entry_fn: Callable[[], AmcEntry],
         name_prefix: str,
-        id_prefix: str
+        id_prefix: str,
+        context: set[str] | None = None
     ) -> None:
-        super().__init__(coordinator)
-        self.coordinator = coordinator
-
         self._amc_entry_fn = amc_entry_fn
         self._amc_entry = amc_entry = self._amc_entry_fn()
+        # the attributes are built once per entry update, not at every state write
+        self._amc_entry_version = 0
+        self._attributes_cache_key = None
+        self._attributes_cache = None
+
+        # updated by the coordinator only when the states keys in context change
+        if context is None:
+            group = getattr(amc_entry, "group", None)
+            context = {states_key(CentralDataSections.SYSTEM_STATUS if group is None else group, amc_entry.index)}
+        super().__init__(coordinator, frozenset(context))
+        self.coordinator = coordinator
 
         self._attr_name = ((name_prefix or "").strip() + " " + (amc_entry.name or f"{type(self).__name__} {amc_entry.index}").strip()).strip()
         if len(name_prefix or "") > 0:
@@ -51,6 +71,7 @@ class AmcBaseEntity(CoordinatorEntity):
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
         self._amc_entry = self._amc_entry_fn()
+        self._amc_entry_version += 1
 
         super()._handle_coordinator_update()
 
@@ -59,6 +80,22 @@ class AmcBaseEntity(CoordinatorEntity):
         self._handle_coordinator_update()
         await super().async_added_to_hass()
 
+    @property
+    def _amc_optimistic_state(self) -> int | None:
+        """State requested by a setStates and not yet confirmed by the panel, None if nothing is pending."""
+        return self.coordinator.api.optimistic_state(getattr(self._amc_entry, "filter_id", None))
+
     @property
     def extra_state_attributes(self) -> Optional[dict[str, Any]]:
-        return self._amc_entry.dict()
+        stale = self.coordinator.states_stale
+        pending = self._amc_optimistic_state is not None
+        key = (self._amc_entry_version, stale, pending)
+        if key != self._attributes_cache_key:
+            attributes = entry_attributes(self._amc_entry, self.coordinator.attributes_profile)
+            if stale:
+                attributes = {**(attributes or {}), "stale": True}
+            if pending:
+                attributes = {**(attributes or {}), "pending": True}
+            self._attributes_cache_key = key
+            self._attributes_cache = attributes
+        return self._attributes_cache
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import Callable
+from datetime import timedelta
+from typing import Any, Callable
 
-from homeassistant.const import PERCENTAGE, SIGNAL_STRENGTH_DECIBELS, EntityCategory
+from homeassistant.const import PERCENTAGE, SIGNAL_STRENGTH_DECIBELS, EntityCategory, UnitOfDataRate, UnitOfTime
 from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
@@ -14,10 +15,13 @@ from .amc_alarm_api.amc_proto import (
     AmcNotificationEntry,
     SystemStatusDataSections,
 )
-from .amc_alarm_api.api import AmcStatesParser
+from .amc_alarm_api.api import AmcNotificationStore, AmcStatesParser, states_key, STATES_KEY_CONNECTION
 from .const import *
 from .entity import AmcBaseEntity
 
+# polling of the metrics sensors, the other sensors are updated by the coordinator
+SCAN_INTERVAL = timedelta(seconds=METRICS_SCAN_INTERVAL)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -30,9 +34,11 @@ async def async_setup_entry(
     
     sensors.append(DeviceStatusSensor(coordinator=coordinator))
     sensors.append(DeviceStatusConnectivitySensor(coordinator=coordinator))
+    sensors.extend(metrics_sensors(coordinator))
 
     def _notifications(_central_id):
-        return lambda: coordinator.data_parsed.notifications(_central_id)
+        # the api handles only the configured central
+        return lambda: coordinator.api.notifications
 
     def _system_status(_central_id, index):
         return lambda: coordinator.data_parsed.system_status(_central_id, index)
@@ -107,18 +113,33 @@ class AmcSignalSensor(AmcBaseEntity, SensorEntity):
         else:
             return "mdi:network-strength-outline"
 
+def notifications_attributes(notifications: AmcNotificationStore, profile: str) -> dict[str, Any] | None:
+    """Notifications history as attributes, only the latest one (and the count) with the compact profile."""
+    if profile == ATTRIBUTES_PROFILE_NONE:
+        return None
+    if profile == ATTRIBUTES_PROFILE_COMPACT:
+        notification = notifications.latest()
+        return {
+            "serverDate": notification.serverDate,
+            "category": notification.category,
+            "count": len(notifications),
+        }
+    return {x.serverDate: x.name for x in notifications}
+
+
 class AmcNotification(CoordinatorEntity, SensorEntity):
     _attr_has_entity_name = True
 
     def __init__(
         self,
         coordinator: AmcDataUpdateCoordinator,
-        amc_notifications_fn: Callable[[],list[AmcNotificationEntry]],
+        amc_notifications_fn: Callable[[], AmcNotificationStore],
     ) -> None:
-        super().__init__(coordinator)
+        super().__init__(coordinator, frozenset({states_key(CentralDataSections.NOTIFICATIONS)}))
 
         self._amc_notifications_fn = amc_notifications_fn
-        self._amc_notifications = amc_notifications = amc_notifications_fn()
+        self._notifications_version = None
+        self._last_available = None
 
         self._attr_name = "Notifications"
         self._attr_unique_id = coordinator.get_id_prefix() + str(CentralDataSections.NOTIFICATIONS)
@@ -135,14 +156,18 @@ class AmcNotification(CoordinatorEntity, SensorEntity):
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        self._amc_notifications: list[AmcNotificationEntry] = self._amc_notifications_fn()
-        if self._amc_notifications:
-            notification = self._amc_notifications[0]
-            self._attr_native_value = notification.name
-
-            self._attr_extra_state_attributes = {
-                x.serverDate: x.name for x in self._amc_notifications
-            }
+        notifications = self._amc_notifications_fn()
+        available = self.available
+        if notifications.version == self._notifications_version and available == self._last_available:
+            # e.g. only the unvisited counter is changed
+            return
+        self._last_available = available
+        if notifications.version != self._notifications_version:
+            self._notifications_version = notifications.version
+            notification = notifications.latest()
+            if notification:
+                self._attr_native_value = notification.name
+                self._attr_extra_state_attributes = notifications_attributes(notifications, self.coordinator.attributes_profile)
 
         super()._handle_coordinator_update()
 
@@ -157,7 +182,7 @@ class DeviceStatusSensor(CoordinatorEntity, SensorEntity):
     _attr_entity_category = (EntityCategory.DIAGNOSTIC)
 
     def __init__(self, coordinator):
-        super().__init__(coordinator)
+        super().__init__(coordinator, frozenset({STATES_KEY_CONNECTION}))
         self.coordinator = coordinator
         self._attr_name = "Device Status"
         self._attr_unique_id = f"{coordinator.get_id_prefix()}_status"
@@ -217,7 +242,7 @@ class DeviceStatusConnectivitySensor(CoordinatorEntity, SensorEntity):
     _attr_entity_category = (EntityCategory.DIAGNOSTIC)
 
     def __init__(self, coordinator):
-        super().__init__(coordinator)
+        super().__init__(coordinator, frozenset({STATES_KEY_CONNECTION}))
         self.coordinator = coordinator
         self._attr_name = "Device Connectivity"
         self._attr_unique_id = f"{coordinator.get_id_prefix()}_connectivity"
@@ -264,4 +289,75 @@ def getattr_nested(obj, attr_path, default=None):
         obj = getattr(obj, attr, None)
         if obj is None:
             return default
-    return obj
\ No newline at end of file
+    return obj
+
+
+def metrics_sensors(coordinator: AmcDataUpdateCoordinator) -> list[SensorEntity]:
+    """Diagnostic sensors of the metrics (api.metrics_stats), the percentiles are in the attributes."""
+    def _rtt(command):
+        return lambda stats: stats["rtt"].get(command, {})
+
+    def _received(stats):
+        return stats["received"]
+
+    def _update_latency(stats):
+        return stats["update_latency"]
+
+    return [
+        AmcMetricSensor(coordinator, "getStates round trip", "metrics_rtt_get_states", _rtt("getStates"), "p95", 1000,
+                        UnitOfTime.MILLISECONDS),
+        AmcMetricSensor(coordinator, "setStates round trip", "metrics_rtt_set_states", _rtt("setStates"), "p95", 1000,
+                        UnitOfTime.MILLISECONDS),
+        AmcMetricSensor(coordinator, "Update latency", "metrics_update_latency", _update_latency, "p95", 1000,
+                        UnitOfTime.MILLISECONDS),
+        AmcMetricSensor(coordinator, "Messages received", "metrics_messages_received", _received, "per_second", 1,
+                        "msg/s"),
+        AmcMetricSensor(coordinator, "Data received", "metrics_bytes_received", _received, "bytes_per_second", 1,
+                        UnitOfDataRate.BYTES_PER_SECOND),
+        AmcMetricSensor(coordinator, "Reconnects", "metrics_reconnects", lambda stats: stats, "reconnects", 1,
+                        None, SensorStateClass.TOTAL_INCREASING, enabled=True),
+    ]
+
+
+class AmcMetricSensor(SensorEntity):
+    """Value of the metrics of the api, polled every METRICS_SCAN_INTERVAL seconds."""
+    _attr_has_entity_name = True
+    _attr_entity_category = (EntityCategory.DIAGNOSTIC)
+    _attr_should_poll = True
+
+    def __init__(
+        self,
+        coordinator: AmcDataUpdateCoordinator,
+        name: str,
+        key: str,
+        stats_fn: Callable[[dict], dict],
+        value_key: str,
+        scale: float,
+        unit: str | None,
+        state_class: SensorStateClass = SensorStateClass.MEASUREMENT,
+        enabled: bool = False,
+    ) -> None:
+        self.coordinator = coordinator
+        self._stats_fn = stats_fn
+        self._value_key = value_key
+        self._scale = scale
+        self._attr_name = name
+        self._attr_unique_id = f"{coordinator.get_id_prefix()}_{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        # the metrics change at every message, only the reconnects are recorded by default
+        self._attr_entity_registry_enabled_default = enabled
+        self._attr_extra_state_attributes = None
+
+    @property
+    def device_info(self):
+        return self.coordinator.device_info
+
+    async def async_update(self) -> None:
+        stats = self._stats_fn(self.coordinator.api.metrics_stats())
+        value = stats.get(self._value_key)
+        self._attr_native_value = round(value * self._scale, 1) if value is not None else None
+        # all the percentiles of the latencies
+        self._attr_extra_state_attributes = {
+            k: v if k == "count" else round(v * self._scale, 1) for k, v in stats.items()
+        } if self._value_key in ("p50", "p95", "p99") else None
@@ -44,9 +44,12 @@ class AmcOutput(AmcBaseEntity, SwitchEntity):
     _amc_group_id = CentralDataSections.OUTPUTS
     _attr_device_class = SwitchDeviceClass.SWITCH
 
-    def _handle_coordinator_update(self) -> None:
-        super()._handle_coordinator_update()
-        self._attr_is_on = self._amc_entry.states.bit_on == 1
+    @property
+    def is_on(self) -> bool:
+        pending = self._amc_optimistic_state
+        if pending is not None:
+            return pending == 1
+        return self._amc_entry.states.bit_on == 1
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         api = self.coordinator.api
@@ -0,0 +1,225 @@
+"""Benchmark of the amc_alarm_api hot paths on synthetic panels of growing size.
+
+Usage:
+    python scripts/bench_api.py [--zones 16 64 256 1024] [--repeat 500]
+                                [--save-baseline FILE] [--compare FILE] [--tolerance 0.25]
+
+For every panel size and operation reports:
+    time_us     time of an operation, best batch (as timeit, the less noisy on a busy machine)
+    peak_kb     tracemalloc peak (transient allocations) of an operation
+    blocks      allocated blocks retained per operation (should be ~0, leaks show up here)
+
+--compare exits with code 1 if an operation is slower (or its peak bigger) than the baseline beyond
+the tolerance. Times are compared normalized by a calibration workload measured in the same run,
+anyway baselines are machine dependent: better save one before the change and compare after it.
+"""
+
+# pylint: skip-file
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from itertools import cycle
+
+from aiohttp import WSMessage, WSMsgType
+
+import synthetic
+from amc_alarm_api.api import AmcStatesParser, SimplifiedAmcApi, states_key
+
+DEFAULT_ZONES = [16, 64, 256, 1024]
+BATCH = 5
+CENTRAL_ID = synthetic.CENTRAL_ID
+
+
+def text_message(message: dict) -> WSMessage:
+    return WSMessage(WSMsgType.TEXT, json.dumps(message), None)
+
+
+async def build_operations(zones: int) -> dict:
+    """Operations to measure, as zero arguments callables (sync or async)."""
+    api = SimplifiedAmcApi("user@example.com", "password", CENTRAL_ID, "user", "password")
+    api.flush_delay = 3600  # flush executed explicitly
+    states_message = text_message(synthetic.get_states_message(zones=zones))
+    await api._process_message(states_message)
+
+    patch_frames = cycle([text_message(m) for m in synthetic.patch_messages(1000, zones=zones)])
+    zone_patches = cycle([
+        {"op": "replace", "path": f"/centrals/{CENTRAL_ID}/data/2/list/{i}/states", "value": synthetic.entry_states(bit_opened=i % 2)}
+        for i in random.Random(1).sample(range(zones), zones)
+    ])
+    zones_list = api.raw_states()[CENTRAL_ID].data[2].list
+    zone_ids = [z.Id for z in zones_list]
+    last_zone_key = {states_key(2, zones - 1)}
+
+    async def get_states():
+        await api._process_message(states_message)
+
+    async def apply_patch():
+        await api._process_message(next(patch_frames))
+        await api._flush()
+
+    async def process_json_patch():
+        await api._process_json_patch(api.raw_states(), next(zone_patches))
+
+    def list_pos():
+        api._list_pos(zones_list, zones - 1)
+
+    async def set_calculated_states_full():
+        await api._set_calculated_states()
+
+    async def set_calculated_states_partial():
+        await api._set_calculated_states(last_zone_key)
+
+    def parser_build_lookup():
+        AmcStatesParser(api.raw_states()).zone(CENTRAL_ID, zone_ids[-1])
+
+    parser = AmcStatesParser(api.raw_states())
+
+    def parser_lookup_all_zones():
+        for zone_id in zone_ids:
+            parser.zone(CENTRAL_ID, zone_id)
+
+    return {
+        "getStates": get_states,
+        "applyPatch+flush": apply_patch,
+        "_process_json_patch": process_json_patch,
+        "_list_pos": list_pos,
+        "_set_calculated_states": set_calculated_states_full,
+        "_set_calculated_states(1 key)": set_calculated_states_partial,
+        "parser build+lookup": parser_build_lookup,
+        "parser lookup all zones": parser_lookup_all_zones,
+    }
+
+
+async def call(fn):
+    res = fn()
+    if asyncio.iscoroutine(res):
+        await res
+
+
+async def measure(fn, repeat: int) -> dict:
+    for _ in range(min(repeat, 10)):
+        await call(fn)
+
+    # batches of calls, for cheap operations the timer resolution is not negligible
+    times = []
+    for _ in range(max(1, repeat // BATCH)):
+        start = time.perf_counter()
+        for _ in range(BATCH):
+            await call(fn)
+        times.append((time.perf_counter() - start) / BATCH)
+
+    count = max(1, repeat // 10)
+    gc.collect()
+    tracemalloc.start()
+    peak = 0
+    blocks = sys.getallocatedblocks()
+    for _ in range(count):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await call(fn)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    gc.collect()
+    blocks = (sys.getallocatedblocks() - blocks) / count
+
+    return {
+        "time_us": round(min(times) * 1e6, 2),
+        "peak_kb": round(peak / 1024, 2),
+        "blocks": round(blocks, 1),
+    }
+
+
+def calibration_workload():
+    # pure python work similar to the hot paths (dict/list/attribute access), for normalize the machine speed
+    data = [{"index": i, "states": {"bit_on": i % 2}} for i in range(200)]
+    return sum(1 for item in data if item["states"]["bit_on"] and str(item.get("index")) != "-1")
+
+
+async def run(zones_list: list[int], repeat: int) -> dict:
+    results = {"calibration": await measure(calibration_workload, repeat)}
+    for zones in zones_list:
+        operations = await build_operations(zones)
+        # big panels, less repetitions
+        count = max(50, repeat * 16 // max(16, zones))
+        results[str(zones)] = {name: await measure(fn, count) for name, fn in operations.items()}
+    return results
+
+
+def speed_factor(results: dict, baseline: dict) -> float:
+    """Baseline machine speed / current machine speed, from the calibration workload."""
+    try:
+        return results["calibration"]["time_us"] / baseline["calibration"]["time_us"]
+    except (KeyError, ZeroDivisionError):
+        return 1.0
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    factor = speed_factor(results, baseline)
+    for zones, operations in results.items():
+        if zones == "calibration":
+            continue
+        for name, row in operations.items():
+            base = baseline.get(zones, {}).get(name)
+            if not base:
+                continue
+            for metric, minimum, scale in (("time_us", 1.0, factor), ("peak_kb", 1.0, 1.0)):
+                limit = max(base[metric] * scale * (1 + tolerance), base[metric] * scale + minimum)
+                if row[metric] > limit:
+                    regressions.append(f"{zones} zones {name}: {metric} {row[metric]} > baseline {base[metric]}")
+    return regressions
+
+
+def print_results(results: dict, baseline: dict | None):
+    factor = speed_factor(results, baseline) if baseline else 1.0
+    print(f"calibration: {results['calibration']['time_us']} us" + (f", speed factor vs baseline {factor:.2f}" if baseline else ""))
+    for zones, operations in results.items():
+        if zones == "calibration":
+            continue
+        print(f"\n{zones} zones")
+        print(f"{'operation':<32}{'time_us':>12}{'peak_kb':>10}{'blocks':>9}" + (f"{'vs base':>10}" if baseline else ""))
+        for name, row in operations.items():
+            line = f"{name:<32}{row['time_us']:>12}{row['peak_kb']:>10}{row['blocks']:>9}"
+            base = (baseline or {}).get(zones, {}).get(name)
+            if base and base["time_us"]:
+                line += f"{row['time_us'] / base['time_us'] / factor:>9.2f}x"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, nargs="+", default=DEFAULT_ZONES)
+    parser.add_argument("--repeat", type=int, default=500, help="repetitions at 16 zones, scaled down on bigger panels")
+    parser.add_argument("--save-baseline", help="save the results as baseline")
+    parser.add_argument("--compare", help="baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.zones, args.repeat))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
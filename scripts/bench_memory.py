@@ -0,0 +1,134 @@
+"""Memory retained by the api states, and cost of the aggregate queries, on a synthetic panel.
+
+Usage:
+    python scripts/bench_memory.py [--zones 1024] [--repeat 200]
+
+Reports the memory (tracemalloc) retained by:
+    json model      the getStates dict, as parsed from the frame (transient, the api keeps the typed models only)
+    typed models    the pydantic models validated from it
+    state table     the AmcStateTable (state bits of groups/areas/zones/outputs)
+    api             a SimplifiedAmcApi after the getStates (all the above, indexes included)
+and the time of "open/anomaly/not ready zones" and "open zones by area" with a loop over the models
+and with the state table.
+"""
+
+# pylint: skip-file
+
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+from aiohttp import WSMessage, WSMsgType
+
+import synthetic
+from amc_alarm_api.amc_proto import AmcCommandResponse, CentralDataSections
+from amc_alarm_api.api import AmcStateTable, SimplifiedAmcApi, json_loads
+
+
+def retained(fn):
+    """Return (result of fn, bytes retained by it)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def best_time(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+async def run(zones: int, repeat: int) -> dict:
+    text = json.dumps(synthetic.get_states_message(zones=zones))
+    raw, json_size = retained(lambda: json_loads(text))
+    _, typed_size = retained(lambda: AmcCommandResponse.model_validate(raw, strict=False))
+
+    async def connected_api():
+        api = SimplifiedAmcApi("user@example.com", "password", synthetic.CENTRAL_ID, "user", "password")
+        await api._process_message(WSMessage(WSMsgType.TEXT, text, None))
+        return api
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    api = await connected_api()
+    gc.collect()
+    api_size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    entries = list(api.raw_entities.values())
+
+    def build_table():
+        table = AmcStateTable()
+        table.rebuild(entries, api._area_zones, api._group_areas)
+        return table
+
+    table, table_size = retained(build_table)
+
+    zones_list = [e for e in entries if e.group == CentralDataSections.ZONES]
+
+    def models_counts():
+        return (
+            sum(1 for e in zones_list if e.states.bit_opened),
+            sum(1 for e in zones_list if e.states.anomaly),
+            sum(1 for e in zones_list if e.states.bit_notReady),
+        )
+
+    def table_counts():
+        return (
+            table.count("bit_opened", CentralDataSections.ZONES),
+            table.count("anomaly", CentralDataSections.ZONES),
+            table.count("bit_notReady", CentralDataSections.ZONES),
+        )
+
+    def models_by_area():
+        return {area_id: sum(1 for z in zones if z.states.bit_opened) for area_id, zones in api._area_zones.items()}
+
+    def table_by_area():
+        return table.area_counts("bit_opened")
+
+    assert models_counts() == table_counts() and models_by_area() == table_by_area()
+    return {
+        "zones": zones,
+        "memory_kb": {
+            "json model": round(json_size / 1024, 1),
+            "typed models": round(typed_size / 1024, 1),
+            "state table": round(table_size / 1024, 1),
+            "api": round(api_size / 1024, 1),
+        },
+        "query_us": {
+            "counts (models loop)": round(best_time(models_counts, repeat) * 1e6, 2),
+            "counts (state table)": round(best_time(table_counts, repeat) * 1e6, 2),
+            "open by area (models loop)": round(best_time(models_by_area, repeat) * 1e6, 2),
+            "open by area (state table)": round(best_time(table_by_area, repeat) * 1e6, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.zones, args.repeat))
+    print(f"{results['zones']} zones")
+    for section in ("memory_kb", "query_us"):
+        print(f"\n{section}")
+        for name, value in results[section].items():
+            print(f"  {name:<30}{value:>12}")
+
+
+if __name__ == "__main__":
+    main()
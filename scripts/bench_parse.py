@@ -0,0 +1,106 @@
+"""Parse cost per message type: single parse (json model + typed models from it) vs the double parse.
+
+Usage:
+    python scripts/bench_parse.py [--frames FILE.jsonl] [--zones 64] [--patches 500] [--repeat 20]
+
+FILE.jsonl has a received frame per line, as JSON string or as object with the frame in "data"
+(e.g. the capture files). Without --frames, synthetic frames are used.
+"""
+
+# pylint: skip-file
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import synthetic  # noqa: F401, set the import path
+from amc_alarm_api.amc_proto import AmcCommandResponse
+from amc_alarm_api.api import json_loads
+
+
+def load_frames(path: str) -> list[str]:
+    frames = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if item.get("direction", "in") != "in":
+                    continue
+                item = item.get("data")
+            if isinstance(item, str):
+                frames.append(item)
+    return frames
+
+
+def synthetic_frames(zones: int, patches: int) -> list[str]:
+    frames = [
+        json.dumps({"command": "loginUser", "status": "Logged", "user": {
+            "email": "user@example.com", "password": "", "userState": "ok", "token": "token"}}),
+        json.dumps(synthetic.get_states_message(zones=zones)),
+        json.dumps({"command": "getStates", "status": "ko", "layout": None, "centrals": {
+            synthetic.CENTRAL_ID: {"statusID": -1, "status": "not available"}}}),
+    ]
+    frames.extend(json.dumps(m) for m in synthetic.patch_messages(patches, zones=zones))
+    return frames
+
+
+def parse_double(frame: str):
+    # before: typed models from the string, then the json model from the same string
+    data = AmcCommandResponse.model_validate_json(frame, strict=False)
+    if data.command in ("getStates", "applyPatch"):
+        json.loads(frame)
+    return data
+
+
+def parse_single(frame: str):
+    return AmcCommandResponse.model_validate(json_loads(frame), strict=False)
+
+
+def bench(frames: list[str], repeat: int) -> dict[str, dict]:
+    by_command: dict[str, list[str]] = defaultdict(list)
+    for frame in frames:
+        try:
+            by_command[json.loads(frame).get("command", "?")].append(frame)
+        except (ValueError, AttributeError):
+            by_command["invalid"].append(frame)
+    results = {}
+    for command, items in sorted(by_command.items()):
+        row = {"frames": len(items), "avg_bytes": sum(len(f) for f in items) // len(items)}
+        for name, fn in (("double_us", parse_double), ("single_us", parse_single)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for frame in items:
+                    try:
+                        fn(frame)
+                    except ValueError:
+                        pass
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            row[name] = round(best / len(items) * 1e6, 2)
+        row["speedup"] = round(row["double_us"] / row["single_us"], 2) if row["single_us"] else None
+        results[command] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", help="JSONL file with the received frames")
+    parser.add_argument("--zones", type=int, default=64)
+    parser.add_argument("--patches", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames(args.zones, args.patches)
+    print(f"json_loads: {json_loads.__module__}.{json_loads.__name__}, frames: {len(frames)}")
+    print(f"{'command':<16}{'frames':>8}{'bytes':>9}{'double us':>12}{'single us':>12}{'speedup':>9}")
+    for command, row in bench(frames, args.repeat).items():
+        print(f"{command:<16}{row['frames']:>8}{row['avg_bytes']:>9}{row['double_us']:>12}{row['single_us']:>12}{row['speedup']:>9}")
+
+
+if __name__ == "__main__":
+    main()
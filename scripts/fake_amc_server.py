@@ -0,0 +1,282 @@
+"""Local stand-in of the AMC cloud websocket, for load and latency tests without a real central.
+
+Usage:
+    python scripts/fake_amc_server.py [--port 8765] [--zones 64] [--centrals 1] [--patch-rate 5] [--latency-ms 50] [--disconnect-every 0]
+
+Point the api to it with:
+    SimplifiedAmcApi(email, password, fake_amc_server.CENTRAL_ID, "user", "password", ws_url="ws://127.0.0.1:8765/ws/client")
+
+With --centrals N the account has N centrals (synthetic.central_ids), for the shared connection tests.
+
+Implemented commands: loginUser, getStates, setStates (confirmed by an applyPatch, as the cloud does)
+and the applyPatch push of random state changes.
+"""
+
+# pylint: skip-file
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import secrets
+
+from aiohttp import WSMsgType, web
+
+import synthetic
+
+_LOGGER = logging.getLogger("fake_amc_server")
+
+CENTRAL_ID = synthetic.CENTRAL_ID
+
+
+class FakeAmcServer:
+    """Shared panel states, served to all the connected clients."""
+
+    def __init__(
+        self,
+        zones: int = 16,
+        areas: int = None,
+        outputs: int = 4,
+        notifications: int = 10,
+        patch_rate: float = 0,
+        latency: float = 0,
+        jitter: float = 0,
+        disconnect_every: float = 0,
+        email: str = None,
+        password: str = None,
+        central_password: str = None,
+        seed: int = 1,
+        centrals: int = 1,
+    ):
+        self.central_ids = synthetic.central_ids(centrals)
+        # states of all the centrals of the account, the getStates responses include the requested ones
+        self.states = synthetic.get_states_message(CENTRAL_ID, zones=zones, areas=areas, outputs=outputs, notifications=notifications)
+        for central_id in self.central_ids[1:]:
+            self.states["centrals"][central_id] = synthetic.panel_central(zones=zones, areas=areas, outputs=outputs, notifications=notifications)
+        self.zones = zones
+        self.areas = areas
+        self.patch_rate = patch_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.disconnect_every = disconnect_every
+        self.email = email
+        self.password = password
+        self.central_password = central_password
+        self.seed = seed
+        # connected clients -> centrals of their getStates
+        self.clients: dict[web.WebSocketResponse, set[str]] = {}
+        self.stats = {"connections": 0, "disconnects": 0, "logins": 0, "received": 0, "sent": 0, "patches": 0, "set_states": 0}
+        self._tokens: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/ws/client", self._handle_ws)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        if self.patch_rate > 0:
+            self._tasks.append(asyncio.create_task(self._patch_storm()))
+        if self.disconnect_every > 0:
+            self._tasks.append(asyncio.create_task(self._disconnects()))
+
+    async def _on_cleanup(self, app):
+        for task in self._tasks:
+            task.cancel()
+        for ws in list(self.clients):
+            await ws.close()
+        _LOGGER.info("Stats: %s", self.stats)
+
+    async def _delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    async def _send(self, ws: web.WebSocketResponse, message: dict):
+        await self._delay()
+        if ws.closed:
+            return
+        await ws.send_str(json.dumps(message))
+        self.stats["sent"] += 1
+
+    async def broadcast(self, message: dict):
+        self.apply_patch(message["patch"])
+        self.stats["patches"] += 1
+        central_id = message["patch"][0]["path"].split("/")[2]
+        clients = [ws for ws, centrals in list(self.clients.items()) if central_id in centrals]
+        await asyncio.gather(*[self._send(ws, message) for ws in clients], return_exceptions=True)
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        _LOGGER.info("Client connected: %s", request.remote)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                self.stats["received"] += 1
+                try:
+                    command = json.loads(msg.data)
+                except ValueError:
+                    continue
+                # handled concurrently, as the cloud does
+                asyncio.create_task(self._handle_command(ws, command))
+        finally:
+            self.clients.pop(ws, None)
+            _LOGGER.info("Client disconnected: %s", request.remote)
+        return ws
+
+    async def _handle_command(self, ws: web.WebSocketResponse, command: dict):
+        match command.get("command"):
+            case "loginUser":
+                login = command.get("data") or {}
+                if (self.email and login.get("email") != self.email) or (self.password and login.get("password") != self.password):
+                    await self._send(ws, {"command": "loginUser", "status": "User not found"})
+                    return
+                self.stats["logins"] += 1
+                token = secrets.token_hex(16)
+                self._tokens.add(token)
+                await self._send(ws, {"command": "loginUser", "status": "Logged", "user": {
+                    "email": login.get("email"), "password": "", "userState": "active", "token": token}})
+            case "getStates":
+                if command.get("token") not in self._tokens:
+                    await self._send(ws, {"command": "getStates", "status": "error", "message": "not logged, please login"})
+                    return
+                centrals = {}
+                for central in command.get("centrals") or []:
+                    central_id = central.get("centralID")
+                    if central_id not in self.central_ids:
+                        centrals[central_id] = {"statusID": -1, "status": "not available"}
+                    elif self.central_password and central.get("centralPassword") != self.central_password:
+                        centrals[central_id] = {"amcProtoVer": 2, "realName": "X864V", "statusID": 0, "status": "wrong login X864V/4.10"}
+                    else:
+                        centrals[central_id] = self.states["centrals"][central_id]
+                status = "ok" if any(c.get("statusID", 0) >= 0 for c in centrals.values()) else "ko"
+                await self._send(ws, {"command": "getStates", "status": status, "layout": None, "centrals": centrals})
+                if status != "ok":
+                    return
+                # patches are pushed only to the clients that received the states
+                self.clients.setdefault(ws, set()).update(
+                    central_id for central_id, central in centrals.items() if central.get("statusID", 0) > 0)
+            case "setStates":
+                if command.get("token") not in self._tokens or command.get("centralID") not in self.central_ids:
+                    return
+                self.stats["set_states"] += 1
+                await self._delay()
+                await self._set_states(command.get("centralID"), command.get("group"), command.get("index"), bool(command.get("state")))
+            case _:
+                _LOGGER.debug("Command ignored: %s", command)
+
+    async def _set_states(self, central_id: str, group: int, index: int, state: bool):
+        entry = self._find_entry(central_id, group, index)
+        if entry is None:
+            return
+        value = dict(entry["states"])
+        value["bit_on"] = 1 if state else 0
+        if group in (0, 1):
+            value["bit_armed"] = value["bit_on"]
+        await self.broadcast({"command": "applyPatch", "patch": [
+            {"op": "replace", "path": f"/centrals/{central_id}/data/{group}/list/{index}/states", "value": value}]})
+
+    def _find_entry(self, central_id: str, group: int, index: int) -> dict | None:
+        for section in self.states["centrals"][central_id]["data"]:
+            if section.get("index") == group:
+                return next((e for e in section.get("list", []) if e.get("index") == index), None)
+        return None
+
+    def apply_patch(self, patch: list[dict]):
+        """Keep the served states aligned with the pushed patches (same path rules of the api)."""
+        for p in patch:
+            path = p["path"].strip("/").split("/")
+            target = self.states
+            for key in path[:-1]:
+                if key.isdigit() and isinstance(target, list):
+                    key = next(i for i, item in enumerate(target) if str(item.get("index")) == key)
+                target = target[key]
+            last_key = int(path[-1]) if path[-1].isdigit() else path[-1]
+            if p["op"] == "add" and isinstance(target, list):
+                target.insert(last_key, p["value"])
+            elif p["op"] == "replace" and isinstance(target[last_key], dict):
+                target[last_key].update(p["value"])
+            elif p["op"] == "remove":
+                target.pop(last_key)
+            else:
+                target[last_key] = p["value"]
+
+    async def _patch_storm(self):
+        messages = [
+            synthetic.patch_messages(2**31, zones=self.zones, areas=self.areas, central_id=central_id, seed=self.seed + n)
+            for n, central_id in enumerate(self.central_ids)
+        ]
+        rnd = random.Random(self.seed)
+        while True:
+            await asyncio.sleep(1 / self.patch_rate)
+            if self.clients:
+                await self.broadcast(next(rnd.choice(messages)))
+
+    async def _disconnects(self):
+        while True:
+            await asyncio.sleep(self.disconnect_every)
+            _LOGGER.info("Disconnecting %s clients", len(self.clients))
+            self.stats["disconnects"] += len(self.clients)
+            for ws in list(self.clients):
+                await ws.close()
+
+
+@contextlib.asynccontextmanager
+async def serve(server: FakeAmcServer, host: str = "127.0.0.1", port: int = 0):
+    """Run server in the current event loop (port 0: any free port), yields the websocket url."""
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        host, port = runner.addresses[0][:2]
+        yield f"ws://{host}:{port}/ws/client"
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--zones", type=int, default=16)
+    parser.add_argument("--areas", type=int, default=None)
+    parser.add_argument("--outputs", type=int, default=4)
+    parser.add_argument("--centrals", type=int, default=1, help="centrals of the account")
+    parser.add_argument("--notifications", type=int, default=10)
+    parser.add_argument("--patch-rate", type=float, default=0, help="applyPatch messages per second")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay of every sent message")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--disconnect-every", type=float, default=0, help="seconds between forced disconnections")
+    parser.add_argument("--email", help="accepted login email, any if not set")
+    parser.add_argument("--password", help="accepted login password, any if not set")
+    parser.add_argument("--central-password", help="accepted central password, any if not set")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = FakeAmcServer(
+        zones=args.zones,
+        areas=args.areas,
+        outputs=args.outputs,
+        notifications=args.notifications,
+        patch_rate=args.patch_rate,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        disconnect_every=args.disconnect_every,
+        email=args.email,
+        password=args.password,
+        central_password=args.central_password,
+        seed=args.seed,
+        centrals=args.centrals,
+    )
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Replay a frames capture (capture_frames option / SimplifiedAmcApi.start_capture) through _process_message.
+
+Usage:
+    python scripts/replay_capture.py CAPTURE.jsonl [CAPTURE.jsonl.1 ...] [--speed 0] [--profile] [--top 25] [--trace]
+
+--speed 1 replays at the recorded speed, 0 (default) as fast as possible.
+--profile runs the replay under cProfile and prints the top functions by cumulative time.
+--trace adds the time of the message handling stages (AmcTraceCollector) to the stats.
+The patches received before the first getStates of the capture are ignored by the api, as online.
+"""
+
+# pylint: skip-file
+
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+
+import synthetic  # noqa: F401, set the import path
+from amc_alarm_api.api import SimplifiedAmcApi
+from amc_alarm_api.capture import capture_central_id, read_capture, replay_capture
+
+
+async def replay(paths: list[str], speed: float, central_id: str = None, trace: bool = False) -> dict:
+    records = read_capture(paths)
+    central_id = central_id or capture_central_id(records)
+    if not central_id:
+        raise SystemExit("No getStates in the capture, pass --central-id")
+    api = SimplifiedAmcApi("replay@example.com", "replay", central_id, "replay", "replay")
+    if trace:
+        api.start_trace()
+    stats = await replay_capture(api, records, speed)
+    stats["flush"] = api.flush_stats()
+    if trace:
+        report = api.trace_report()
+        stats["trace"] = {"stages": report["stages"], "loop_lag": report["loop_lag"]}
+        api.stop_trace()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="capture files, the rotated ones too")
+    parser.add_argument("--speed", type=float, default=0)
+    parser.add_argument("--central-id")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--trace", action="store_true")
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        stats = profiler.runcall(asyncio.run, replay(args.paths, args.speed, args.central_id, args.trace))
+    else:
+        stats = asyncio.run(replay(args.paths, args.speed, args.central_id, args.trace))
+    print(json.dumps(stats, indent=2))
+    if args.profile:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
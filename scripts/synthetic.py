@@ -0,0 +1,98 @@
+"""Synthetic AMC panel states and patches, for the development tools."""
+
+# pylint: skip-file
+
+import os
+import random
+import sys
+
+# the api package has no Home Assistant dependencies, it can be imported alone
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "amc_alarm"))
+
+CENTRAL_ID = "0A1B2C3D4E5F60718293A4B5C6D7E8F9"
+
+
+def central_ids(count: int) -> list[str]:
+    """Ids of count centrals, the first is CENTRAL_ID."""
+    return [CENTRAL_ID] + [f"{CENTRAL_ID[:-2]}{i:02X}" for i in range(1, count)]
+
+
+def entry_states(**kwargs) -> dict:
+    states = {
+        "redalert": 0, "progress": 0, "bit_showHide": 1, "bit_on": 0, "bit_exludable": 1,
+        "bit_armed": 0, "anomaly": 0, "bit_opened": 0, "bit_notReady": 0,
+    }
+    states.update(kwargs)
+    return states
+
+
+def panel_central(zones: int = 16, areas: int = None, groups: int = None, outputs: int = 4, notifications: int = 10, users: int = 2) -> dict:
+    """Central data as returned by getStates. Areas and groups are scaled on the zones if not specified."""
+    areas = areas or max(1, zones // 4)
+    groups = groups or max(1, areas // 2)
+    data = [
+        {"index": 0, "name": "Gruppi", "list": [
+            {"index": i, "Id": 1000 + i, "name": f"Group {i}", "group": 0, "states": entry_states()}
+            for i in range(groups)
+        ]},
+        {"index": 1, "name": "Aree", "list": [
+            {"index": i, "Id": 2000 + i, "name": f"Area {i}", "group": 1, "filters": [f"0.{i % groups}"],
+             "states": entry_states(), "notifications": []}
+            for i in range(areas)
+        ]},
+        {"index": 2, "name": "Zone", "list": [
+            {"index": i, "Id": 3000 + i, "name": f"Zone {i}", "group": 2, "filters": [f"1.{i % areas}", f"0.{(i % areas) % groups}"],
+             "states": entry_states()}
+            for i in range(zones)
+        ]},
+        {"index": 3, "name": "Uscite", "list": [
+            {"index": i, "Id": 4000 + i, "name": f"Output {i}", "group": 3, "states": entry_states()}
+            for i in range(outputs)
+        ]},
+        {"index": 4, "name": "Sistema", "list": [
+            {"index": i, "name": f"System {i}", "states": entry_states(progress=10)}
+            for i in range(11)
+        ]},
+        {"index": 5, "name": "Notifiche", "unvisited": "0", "list": [
+            {"name": f"Notification {i}", "category": 1, "serverDate": f"Thu, 18 Sep 2025 10:{i // 60 % 60:02}:{i % 60:02} +0200"}
+            for i in range(notifications)
+        ]},
+        {"index": 6, "name": "Status", "model": 1, "firmwareVersion": "4.10"},
+        {"index": 7, "users": {f"{1000 + i}": {"index": i, "name": f"User {i}"} for i in range(users)}},
+    ]
+    return {"statusID": 1, "status": "ok X864V/4.10", "amcProtoVer": 2, "realName": "X864V", "data": data}
+
+
+def get_states_message(central_id: str = CENTRAL_ID, **kwargs) -> dict:
+    return {"command": "getStates", "status": "ok", "layout": None, "centrals": {central_id: panel_central(**kwargs)}}
+
+
+def patch_messages(count: int, zones: int = 16, areas: int = None, central_id: str = CENTRAL_ID, seed: int = 1):
+    """applyPatch messages with the mix seen on a real central: mostly zone states, then areas, notifications, system."""
+    areas = areas or max(1, zones // 4)
+    rnd = random.Random(seed)
+    base = f"/centrals/{central_id}/data"
+    for k in range(count):
+        kind = rnd.random()
+        if kind < 0.5:
+            zone = rnd.randrange(zones)
+            value = entry_states(bit_opened=rnd.randint(0, 1), anomaly=rnd.randint(0, 1), bit_on=rnd.randint(0, 1), bit_armed=rnd.randint(0, 1))
+            patch = [{"op": "replace", "path": f"{base}/2/list/{zone}/states", "value": value}]
+        elif kind < 0.7:
+            area = rnd.randrange(areas)
+            patch = [
+                {"op": "replace", "path": f"{base}/1/list/{area}/states", "value": {"bit_on": rnd.randint(0, 1)}},
+                {"op": "add", "path": f"{base}/1/list/{area}/notifications/0", "value": {
+                    "command": "notification", "name": rnd.choice([f"Arming Area {area}", f"Arming Finished Area {area}"]),
+                    "category": 4, "serverDate": f"s{k}"}},
+            ]
+        elif kind < 0.9:
+            patch = [
+                {"op": "add", "path": f"{base}/5/list/0", "value": {
+                    "command": "notification", "name": f"Notification s{k}", "category": 4, "serverDate": f"s{k}",
+                    "states": {"anomaly": 1}}},
+                {"op": "replace", "path": f"{base}/5/unvisited", "value": str(k)},
+            ]
+        else:
+            patch = [{"op": "replace", "path": f"{base}/4/list/{rnd.randrange(11)}/states", "value": {"progress": rnd.randint(0, 15)}}]
+        yield {"command": "applyPatch", "patch": patch}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the api package and the synthetic panels of the development tools, without Home Assistant
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
@@ -0,0 +1,52 @@
+"""Credentials and PINs must not be written in the frames captures."""
+
+import json
+
+import synthetic
+from amc_alarm_api.capture import REDACTED, redact_frame
+
+CENTRAL = synthetic.CENTRAL_ID
+
+
+def redacted(frame: dict, secrets: list[str] = None) -> dict:
+    return json.loads(redact_frame(json.dumps(frame), secrets))
+
+
+def test_redact_login_and_states():
+    login = redacted({"command": "loginUser", "data": {"email": "user@example.com", "password": "secret"}})
+    assert login["data"] == {"email": REDACTED, "password": REDACTED}
+
+    states = redacted(synthetic.get_states_message(CENTRAL, zones=4, users=2))
+    users = next(s["users"] for s in states["centrals"][CENTRAL]["data"] if s["index"] == 7)
+    assert list(users) == [f"{REDACTED}0", f"{REDACTED}1"]
+    assert users[f"{REDACTED}0"]["name"] == "User 0"
+
+    assert redact_frame("not json secret", ["secret"]) == f"not json {REDACTED}"
+
+
+def test_redact_patch_frames():
+    users_path = f"/centrals/{CENTRAL}/data/7/users"
+    frame = {
+        "command": "applyPatch",
+        "patch": [
+            {"op": "add", "path": f"{users_path}/4321", "value": {"index": 2, "name": "New user", "pin": "4321"}},
+            {"op": "replace", "path": f"{users_path}/1000/name", "value": "Renamed"},
+            {"op": "move", "from": f"{users_path}/1001", "path": f"{users_path}/5678"},
+            {"op": "replace", "path": users_path, "value": {"1234": {"index": 0, "name": "User 0"}}},
+            {"op": "replace", "path": f"/centrals/{CENTRAL}/data/7", "value": {"index": 7, "users": {"9999": {"index": 0}}}},
+            {"op": "remove", "path": f"{users_path}/8765"},
+            {"op": "replace", "path": f"/centrals/{CENTRAL}/data/2/list/0/states/bit_on", "value": 1},
+        ],
+    }
+    patch = redacted(frame)["patch"]
+    text = json.dumps(patch)
+    for pin in ("4321", "1000", "1001", "5678", "1234", "9999", "8765"):
+        assert pin not in text
+
+    assert patch[0] == {"op": "add", "path": f"{users_path}/{REDACTED}", "value": {"index": 2, "name": "New user", "pin": REDACTED}}
+    assert patch[1] == {"op": "replace", "path": f"{users_path}/{REDACTED}/name", "value": "Renamed"}
+    assert patch[2] == {"op": "move", "from": f"{users_path}/{REDACTED}", "path": f"{users_path}/{REDACTED}"}
+    assert patch[3]["value"] == {f"{REDACTED}0": {"index": 0, "name": "User 0"}}
+    assert patch[4]["value"] == {"index": 7, "users": {f"{REDACTED}0": {"index": 0}}}
+    # the other patches are kept as they are
+    assert patch[6] == frame["patch"][6]
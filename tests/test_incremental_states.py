@@ -0,0 +1,161 @@
+"""The states patched incrementally must equal a full rebuild from the same (patched) getStates."""
+
+import asyncio
+import copy
+import json
+
+import pytest
+from aiohttp import WSMessage, WSMsgType
+
+import synthetic
+from amc_alarm_api.amc_proto import CentralDataSections
+from amc_alarm_api.api import SimplifiedAmcApi
+from fake_amc_server import FakeAmcServer
+
+
+def text_message(message: dict) -> WSMessage:
+    return WSMessage(WSMsgType.TEXT, json.dumps(message), None)
+
+
+def bounded_notifications(states: dict, maxlen: int) -> dict:
+    """The states with the notifications lists trimmed as the api does with the patched ones."""
+    states = copy.deepcopy(states)
+    for central in states["centrals"].values():
+        for section in central["data"]:
+            if section["index"] == CentralDataSections.NOTIFICATIONS:
+                del section["list"][maxlen:]
+            for entry in section.get("list") or []:
+                if isinstance(entry, dict) and entry.get("notifications"):
+                    del entry["notifications"][maxlen:]
+    return states
+
+
+async def full_rebuild(states: dict) -> SimplifiedAmcApi:
+    api = SimplifiedAmcApi("user@example.com", "password", synthetic.CENTRAL_ID, "user", "password")
+    await api._process_message(text_message(bounded_notifications(states, api.notifications.maxlen)))
+    return api
+
+
+def calculated_states(api: SimplifiedAmcApi) -> dict:
+    return {
+        "arm_states": {filter_id: entry.arm_state for filter_id, entry in api.raw_entities.items()},
+        "armed_any": api.armed_any,
+        "state_summary": api.state_table.summary(),
+    }
+
+
+async def start(zones: int) -> tuple[FakeAmcServer, SimplifiedAmcApi]:
+    # the fake server applies the patches to the plain json, as the cloud does
+    reference = FakeAmcServer(zones=zones)
+    api = SimplifiedAmcApi("user@example.com", "password", synthetic.CENTRAL_ID, "user", "password")
+    api.flush_delay = 3600  # flush executed explicitly
+    await api._process_message(text_message(reference.states))
+    await api._flush()
+    return reference, api
+
+
+async def assert_equals_rebuild(api: SimplifiedAmcApi, reference: FakeAmcServer, n: int):
+    rebuilt = await full_rebuild(reference.states)
+    assert api.raw_states_json_model == rebuilt.raw_states_json_model, f"states differ after patch {n}"
+    assert calculated_states(api) == calculated_states(rebuilt), f"calculated states differ after patch {n}"
+
+
+async def replay(zones: int, count: int, seed: int):
+    reference, api = await start(zones)
+    for n, message in enumerate(synthetic.patch_messages(count, zones=zones, seed=seed)):
+        reference.apply_patch(message["patch"])
+        await api._process_message(text_message(message))
+        await api._flush()
+        assert api.last_patch_error_time is None, f"patch {n} not applied"
+        await assert_equals_rebuild(api, reference, n)
+
+
+@pytest.mark.parametrize("zones, seed", [(16, 1), (64, 2)])
+def test_patch_stream_equals_full_rebuild(zones, seed):
+    asyncio.run(replay(zones, 300, seed))
+
+
+def test_list_add_remove_shift_positions():
+    """Entries added and removed: the list positions shift, the paths keep addressing the entries by index."""
+    base = f"/centrals/{synthetic.CENTRAL_ID}/data"
+    states = synthetic.entry_states
+
+    def zone(index: int, area: int, **kwargs) -> dict:
+        return {"index": index, "Id": 3000 + index, "name": f"Zone {index}", "group": 2, "filters": [f"1.{area}", "0.0"],
+                "states": states(**kwargs)}
+
+    patches = [
+        [{"op": "remove", "path": f"{base}/2/list/0"}],
+        [{"op": "replace", "path": f"{base}/2/list/5/states", "value": states(bit_opened=1)}],
+        [{"op": "add", "path": f"{base}/2/list/2", "value": zone(99, 0, bit_opened=1)}],
+        [{"op": "replace", "path": f"{base}/1/list/0/states", "value": {"bit_on": 1}}],
+        [{"op": "replace", "path": f"{base}/2/list/99/states", "value": states(bit_opened=0, bit_armed=1)}],
+        [{"op": "remove", "path": f"{base}/2/list/3"}, {"op": "add", "path": f"{base}/2/list/0", "value": zone(98, 1, anomaly=1)}],
+        [{"op": "replace", "path": f"{base}/2/list/98/states", "value": states(anomaly=0, bit_opened=1)}],
+        [{"op": "add", "path": f"{base}/1/list/4", "value": {
+            "index": 9, "Id": 2009, "name": "Area 9", "group": 1, "filters": ["0.0"], "states": states(bit_on=1), "notifications": []}}],
+        [{"op": "remove", "path": f"{base}/1/list/1"}],
+        [{"op": "add", "path": f"{base}/3/list/4", "value": {"index": 4, "Id": 4004, "name": "Output 4", "group": 3, "states": states(bit_on=1)}}],
+        [{"op": "remove", "path": f"{base}/3/list/0"}],
+    ]
+
+    async def run():
+        reference, api = await start(16)
+        for n, patch in enumerate(patches):
+            reference.apply_patch(patch)
+            api.pop_changed_keys()
+            await api._process_message(text_message({"command": "applyPatch", "patch": patch}))
+            await api._flush()
+            assert api.last_patch_error_time is None, f"patch {n} not applied"
+            if any(p["op"] in ("add", "remove") for p in patch):
+                assert api.pop_changed_keys() is None, f"entries changed by patch {n}, all the keys must be marked"
+            await assert_equals_rebuild(api, reference, n)
+        assert "2.99" in api.raw_entities and "2.98" in api.raw_entities
+
+    asyncio.run(run())
+
+
+def test_failing_patch_falls_back_to_full_recompute():
+    """A patch that can't be applied: the states wait the next getStates, all the keys are recalculated."""
+    base = f"/centrals/{synthetic.CENTRAL_ID}/data"
+    valid = {"op": "replace", "path": f"{base}/2/list/1/states", "value": synthetic.entry_states(bit_opened=1)}
+    failing = {"op": "replace", "path": f"{base}/2/list/12345/states", "value": synthetic.entry_states(bit_opened=1)}
+
+    async def run():
+        reference, api = await start(16)
+        full = partial = 0
+        set_full, set_partial = api._set_calculated_states_full, api._set_calculated_states_partial
+
+        def count_full():
+            nonlocal full
+            full += 1
+            set_full()
+
+        def count_partial(keys):
+            nonlocal partial
+            partial += 1
+            return set_partial(keys)
+
+        api._set_calculated_states_full = count_full
+        api._set_calculated_states_partial = count_partial
+        api.pop_changed_keys()
+
+        reference.apply_patch([valid])
+        await api._process_message(text_message({"command": "applyPatch", "patch": [valid, failing]}))
+        await api._flush()
+
+        assert api.last_patch_error_time is not None
+        assert api._msg_quee_get_states
+        assert api.pop_changed_keys() is None
+        assert (full, partial) == (1, 0)
+        # the patches before the failing one are applied
+        await assert_equals_rebuild(api, reference, 0)
+
+        # the next patches are incremental again
+        reference.apply_patch([valid])
+        await api._process_message(text_message({"command": "applyPatch", "patch": [valid]}))
+        await api._flush()
+        assert (full, partial) == (1, 1)
+        await assert_equals_rebuild(api, reference, 1)
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+"""AmcNotificationStore keeps the last notifications of the central, newest first and without duplicates."""
+
+from amc_alarm_api.amc_proto import AmcNotificationEntry
+from amc_alarm_api.api import AmcNotificationStore
+
+
+def entries(*numbers: int) -> list[AmcNotificationEntry]:
+    """Notifications newest first, as in the central list."""
+    return [AmcNotificationEntry(name=f"Notification {n}", category=4, serverDate=f"s{n}") for n in numbers]
+
+
+def names(store: AmcNotificationStore) -> list[str]:
+    return [entry.name for entry in store]
+
+
+def test_sync_adds_only_new_notifications():
+    store = AmcNotificationStore(5)
+    assert store.sync(entries(3, 2, 1))
+    assert names(store) == ["Notification 3", "Notification 2", "Notification 1"]
+    assert store.version == 1
+
+    # same list: no new notifications
+    assert not store.sync(entries(3, 2, 1))
+    assert store.version == 1
+
+    # newer ones at the head of the list, the known ones are not added again
+    assert store.sync(entries(5, 4, 3, 2, 1))
+    assert names(store) == [f"Notification {n}" for n in (5, 4, 3, 2, 1)]
+    assert store.latest().name == "Notification 5"
+    assert store.version == 2
+
+
+def test_sync_keeps_maxlen_and_drops_duplicates():
+    store = AmcNotificationStore(3)
+    assert store.sync(entries(2, 2, 1))
+    assert names(store) == ["Notification 2", "Notification 1"]
+
+    # the oldest are dropped
+    assert store.sync(entries(4, 3, 2, 1))
+    assert names(store) == ["Notification 4", "Notification 3", "Notification 2"]
+    assert len(store) == 3
+    assert store.sync(entries(5, 4))
+    assert names(store) == ["Notification 5", "Notification 4", "Notification 3"]
+
+    # a list longer than maxlen keeps the newest
+    store = AmcNotificationStore(2)
+    assert store.sync(entries(9, 8, 7, 6))
+    assert names(store) == ["Notification 9", "Notification 8"]
+
+
+def test_sync_replaced_list():
+    store = AmcNotificationStore(5)
+    store.sync(entries(3, 2, 1))
+    # nothing in common with the stored ones (e.g. the notifications of the central were cleared)
+    assert store.sync(entries(11, 10))
+    assert names(store) == ["Notification 11", "Notification 10"]
+    assert store.version == 2
+
+    assert not store.sync([])
+    assert names(store) == ["Notification 11", "Notification 10"]
@@ -0,0 +1,128 @@
+"""The state requested by a setStates is shown until a patch confirms it, and dropped when it can't be."""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+import synthetic
+from amc_alarm_api.amc_proto import CentralDataSections
+from amc_alarm_api.api import SimplifiedAmcApi, states_key
+from fake_amc_server import FakeAmcServer, serve
+
+AREA = "1.0"
+AREA_KEY = states_key(CentralDataSections.AREAS, 0)
+PIN = "1000"
+
+
+class Updates:
+    """Coordinator stand-in: the keys of the entities updated by each callback."""
+
+    def __init__(self):
+        self.api: SimplifiedAmcApi | None = None
+        self.keys: list[set[str] | None] = []
+
+    async def __call__(self):
+        self.keys.append(self.api.pop_changed_keys())
+
+    def updated(self, key: str) -> bool:
+        return any(keys is None or key in keys for keys in self.keys)
+
+
+def new_api(url: str, password: str = "password") -> tuple[SimplifiedAmcApi, Updates]:
+    updates = Updates()
+    api = updates.api = SimplifiedAmcApi("user@example.com", password, synthetic.CENTRAL_ID, "user", "password", updates, ws_url=url)
+    api.flush_delay = 0.01
+    return api, updates
+
+
+async def arm_area(api: SimplifiedAmcApi):
+    return await api._send_set_states(CentralDataSections.AREAS, 0, 1, PIN, None)
+
+
+def test_confirmed_by_patch():
+    async def run():
+        async with serve(FakeAmcServer(zones=8, latency=0.2)) as url:
+            api, updates = new_api(url)
+            try:
+                await api.connect()
+                message = await arm_area(api)
+                assert api.optimistic_state(AREA) == 1
+                await asyncio.sleep(0.05)
+                assert updates.updated(AREA_KEY)
+
+                updates.keys.clear()
+                assert await api._get_message_info_result(message, 5)
+                await asyncio.sleep(0.05)
+                assert api.optimistic_state(AREA) is None
+                assert api.raw_entities[AREA].states.bit_on == 1
+                assert updates.updated(AREA_KEY)
+                stats = api.optimistic_stats()
+                assert (stats["pending"], stats["confirmed"], stats["rolled_back"]) == (0, 1, 0)
+                assert 0.2 <= stats["max"] < api.OPTIMISTIC_TIMEOUT
+            finally:
+                await api.disconnect()
+
+    asyncio.run(run())
+
+
+def test_rollback_at_timeout():
+    async def run():
+        # the confirmation arrives after the timeout
+        async with serve(FakeAmcServer(zones=8, latency=0.5)) as url:
+            api, updates = new_api(url)
+            api.OPTIMISTIC_TIMEOUT = 0.2
+            try:
+                await api.connect()
+                await arm_area(api)
+                assert api.optimistic_state(AREA) == 1
+                await asyncio.sleep(0.1)
+                updates.keys.clear()
+
+                await asyncio.sleep(0.2)
+                assert api.optimistic_state(AREA) is None
+                assert api.raw_entities[AREA].states.bit_on == 0
+                assert updates.updated(AREA_KEY)
+                stats = api.optimistic_stats()
+                assert (stats["pending"], stats["confirmed"], stats["rolled_back"]) == (0, 0, 1)
+                assert api._optimistic_handle is None
+            finally:
+                await api.disconnect()
+
+    asyncio.run(run())
+
+
+def test_dropped_on_send_failure():
+    async def run():
+        # not connected, and the reconnection of the retry fails
+        async with serve(FakeAmcServer(zones=8, password="password")) as url:
+            api, updates = new_api(url, password="wrong")
+            await api.load_states_snapshot(synthetic.get_states_message(zones=8))
+            updates.keys.clear()
+            try:
+                with pytest.raises(aiohttp.ClientConnectionError):
+                    await arm_area(api)
+                assert api.optimistic_state(AREA) is None
+                assert api.optimistic_stats()["rolled_back"] == 1
+                assert api._optimistic_handle is None
+                await api._flush()
+                assert updates.updated(AREA_KEY)
+            finally:
+                await api.disconnect()
+
+    asyncio.run(run())
+
+
+def test_cleared_on_disconnect():
+    async def run():
+        async with serve(FakeAmcServer(zones=8, latency=0.5)) as url:
+            api, _ = new_api(url)
+            await api.connect()
+            await arm_area(api)
+            assert api.optimistic_states() == {AREA: 1}
+            await api.disconnect()
+            assert api.optimistic_states() == {}
+            assert api.optimistic_stats()["rolled_back"] == 1
+            assert api._optimistic_handle is None
+
+    asyncio.run(run())
@@ -0,0 +1,101 @@
+"""Centrals of the same account sharing one websocket (AmcConnectionManager), against the fake server."""
+
+import asyncio
+import contextlib
+
+import pytest
+
+import synthetic
+from amc_alarm_api.api import AmcConnectionManager, ConnectionState, SimplifiedAmcApi
+from amc_alarm_api.exceptions import AuthenticationFailed
+from fake_amc_server import FakeAmcServer, serve
+
+
+def shared_apis(manager: AmcConnectionManager, url: str, central_passwords: list[str]) -> list[SimplifiedAmcApi]:
+    apis = []
+    for central_id, central_password in zip(synthetic.central_ids(len(central_passwords)), central_passwords):
+        api = SimplifiedAmcApi("user@example.com", "password", central_id, "user", central_password, ws_url=url)
+        manager.attach(api)
+        apis.append(api)
+    return apis
+
+
+@contextlib.asynccontextmanager
+async def shared(server: FakeAmcServer, central_passwords: list[str]):
+    """The apis of the centrals of server sharing one connection, disconnected at the end."""
+    async with serve(server) as url:
+        manager = AmcConnectionManager()
+        apis = shared_apis(manager, url, central_passwords)
+        try:
+            yield manager, apis
+        finally:
+            for api in apis:
+                await api.disconnect()
+
+
+async def connect(api: SimplifiedAmcApi) -> Exception | None:
+    try:
+        await asyncio.wait_for(api.connect(), 10)
+    except Exception as err:  # pylint: disable=broad-except
+        return err
+    return None
+
+
+def test_attach_detach_handover():
+    async def run():
+        server = FakeAmcServer(zones=8, centrals=3)
+        async with shared(server, ["password"] * 3) as (manager, apis):
+            owner, first, second = apis
+            assert owner._followers == {first._central_id: first, second._central_id: second}
+            assert first._owner is owner and second._owner is owner
+            assert manager.apis() == apis
+
+            assert [await connect(api) for api in apis] == [None] * 3
+            assert [api._ws_state for api in apis] == [ConnectionState.CENTRAL_OK] * 3
+            assert all(api.raw_entities for api in apis)
+            assert server.stats["connections"] == 1
+
+            # a follower detached: the connection is kept
+            await second.disconnect()
+            assert second._owner is None and second._manager is None
+            assert list(owner._followers) == [first._central_id]
+            assert owner._ws_state == ConnectionState.CENTRAL_OK
+
+            # the owner detached: the connection is reopened by the follower left
+            await owner.disconnect()
+            assert manager.apis() == [first]
+            assert first._owner is None and not first._followers
+            assert owner._ws_state == ConnectionState.STOPPED
+            await asyncio.wait_for(first._ensure_central_ok(), 10)
+            assert first._websocket is not None and first._websocket is not owner._websocket
+            assert server.stats["connections"] == 2
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("bad", [0, 1])
+def test_wrong_central_password_stops_only_its_central(bad: int):
+    """A wrong central password (login of the account ok) stops only that central, also when it owns the connection."""
+    async def run():
+        server = FakeAmcServer(zones=8, centrals=2, central_password="good")
+        passwords = ["good", "good"]
+        passwords[bad] = "bad"
+        async with shared(server, passwords) as (manager, apis):
+            failed, working = apis[bad], apis[1 - bad]
+
+            errors = await asyncio.gather(*[connect(api) for api in apis])
+            assert isinstance(errors[bad], AuthenticationFailed)
+            if errors[1 - bad] is not None:
+                # the follower left alone by the failed owner reconnects on its own
+                await asyncio.wait_for(working._ensure_central_ok(), 10)
+
+            assert failed._ws_state == ConnectionState.STOPPED
+            assert isinstance(failed._ws_state_stop_exeception, AuthenticationFailed)
+            assert failed._manager is None and failed._owner is None and not failed._followers
+
+            assert working._ws_state == ConnectionState.CENTRAL_OK
+            assert working._ws_state_stop_exeception is None
+            assert working.raw_entities
+            assert manager.apis() == [working]
+
+    asyncio.run(run())